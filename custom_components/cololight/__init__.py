@@ -1,10 +1,32 @@
 """ cololight """
+import logging
+
+from pycololight import (
+    ColourSchemeException,
+    ColourException,
+    CycleSpeedException,
+    ModeExecption,
+)
+
 from homeassistant.components.light import DOMAIN as LIGHT_DOMAIN
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
 from homeassistant.const import Platform
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+
+from .coordinator import CololightCoordinator
+from .effects import NON_EFFECT_OPTIONS, encode_custom_effect
+from .transport import CololightTransport
+
+_LOGGER = logging.getLogger(__name__)
 
 DOMAIN = "cololight"
+DATA_TRANSPORT = "transport"
+DATA_COORDINATOR = "coordinator"
+DATA_ENTITIES = "entities"
+SHARED_DATA = {DATA_TRANSPORT, DATA_COORDINATOR, DATA_ENTITIES}
+SERVICE_APPLY = "apply"
+SIGNAL_OPTIONS_UPDATED = "cololight_options_updated_{}"
 PLATFORMS = [Platform.LIGHT]
 
 
@@ -13,8 +35,40 @@ async def async_setup(hass, config):
     return True
 
 
+async def async_migrate_entry(hass: HomeAssistant, entry: ConfigEntry):
+    """Migrate old config entries."""
+    if entry.version == 1:
+        # Version 2 stores the encoded commands of custom effects
+        device = entry.data.get("device", "hexagon")
+        options = dict(entry.options)
+        for effect_name, effect_options in entry.options.items():
+            if effect_name in NON_EFFECT_OPTIONS:
+                continue
+            try:
+                options[effect_name] = encode_custom_effect(device, effect_options)
+            except (
+                ColourSchemeException,
+                ColourException,
+                CycleSpeedException,
+                ModeExecption,
+            ):
+                # Left as is, so the error is logged when the light is set up
+                continue
+
+        hass.config_entries.async_update_entry(entry, options=options, version=2)
+        _LOGGER.debug("Migrated Cololight entry %s to version 2", entry.title)
+
+    return True
+
+
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
     """Load the saved entities."""
+    hass.data.setdefault(DOMAIN, {})
+    if DATA_TRANSPORT not in hass.data[DOMAIN]:
+        hass.data[DOMAIN][DATA_TRANSPORT] = CololightTransport()
+    if DATA_COORDINATOR not in hass.data[DOMAIN]:
+        hass.data[DOMAIN][DATA_COORDINATOR] = CololightCoordinator(hass)
+    hass.data[DOMAIN].setdefault(DATA_ENTITIES, {})
 
     entry.async_on_unload(entry.add_update_listener(update_listener))
 
@@ -32,9 +86,17 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
 
     if unload_ok:
         hass.data[DOMAIN].pop(entry.entry_id)
+
+        # Close the shared socket once the last device is unloaded
+        if hass.data[DOMAIN].keys() == SHARED_DATA:
+            await hass.data[DOMAIN].pop(DATA_COORDINATOR).async_shutdown()
+            hass.data[DOMAIN].pop(DATA_TRANSPORT).close()
+            hass.data[DOMAIN].pop(DATA_ENTITIES)
+            hass.services.async_remove(DOMAIN, SERVICE_APPLY)
     return unload_ok
 
 
 async def update_listener(hass: HomeAssistant, entry: ConfigEntry):
     """Handle options update."""
-    await hass.config_entries.async_reload(entry.entry_id)
+    # Effects are updated in place, so the light keeps its state and polling
+    async_dispatcher_send(hass, SIGNAL_OPTIONS_UPDATED.format(entry.entry_id), entry)
@@ -10,16 +10,25 @@ from homeassistant.const import CONF_HOST, CONF_NAME, CONF_MODE
 
 
 from . import DOMAIN
+from .device import DEFAULT_COMMAND_INTERVAL, RATE_LIMITS
+from .discovery import async_discover, async_probe
+from .effects import (
+    colour_scheme_catalogue,
+    colour_scheme_labels,
+    encode_custom_effect,
+)
 
 
 @config_entries.HANDLERS.register(DOMAIN)
 class CololightConfigFlow(config_entries.ConfigFlow):
     """Cololight configuration flow."""
 
-    VERSION = 1
+    VERSION = 2
 
     def __init__(self):
         self.device_data = None
+        self.discovered_hosts = None
+        self.host = None
 
     @staticmethod
     @callback
@@ -32,22 +41,72 @@ class CololightConfigFlow(config_entries.ConfigFlow):
         if user_input is not None:
             await self.async_set_unique_id(user_input[CONF_HOST])
             self._abort_if_unique_id_configured()
-            self.device_data = user_input
-            return await self.async_step_device_effects()
+            if await async_probe(user_input[CONF_HOST]):
+                self.device_data = user_input
+                return await self.async_step_device_effects()
+            errors["base"] = "cannot_connect"
+        else:
+            user_input = {}
+
+        if not user_input and self.discovered_hosts is None and self.host is None:
+            configured_hosts = self._async_current_ids()
+            self.discovered_hosts = [
+                host
+                for host in await async_discover(self.hass)
+                if host not in configured_hosts
+            ]
+            if self.discovered_hosts:
+                return await self.async_step_pick_devices()
 
         options = vol.Schema(
             {
-                vol.Required(CONF_HOST): str,
-                vol.Required(CONF_NAME): str,
+                vol.Required(
+                    CONF_HOST,
+                    default=user_input.get(CONF_HOST, self.host or vol.UNDEFINED),
+                ): str,
+                vol.Required(
+                    CONF_NAME, default=user_input.get(CONF_NAME, vol.UNDEFINED)
+                ): str,
                 vol.Required(
                     "device",
-                    default="hexagon",
+                    default=user_input.get("device", "hexagon"),
                 ): vol.In(["hexagon", "strip"]),
             }
         )
 
         return self.async_show_form(step_id="user", data_schema=options, errors=errors)
 
+    async def async_step_pick_devices(self, user_input=None):
+        """Choose which discovered devices to set up"""
+        if user_input is not None:
+            hosts = user_input["hosts"]
+            for host in hosts[1:]:
+                self.hass.async_create_task(
+                    self.hass.config_entries.flow.async_init(
+                        DOMAIN,
+                        context={"source": config_entries.SOURCE_INTEGRATION_DISCOVERY},
+                        data={CONF_HOST: host},
+                    )
+                )
+            if hosts:
+                self.host = hosts[0]
+            return await self.async_step_user()
+
+        hosts = dict(zip(self.discovered_hosts, self.discovered_hosts))
+        options = {vol.Optional("hosts", default=[]): cv.multi_select(hosts)}
+
+        return self.async_show_form(
+            step_id="pick_devices", data_schema=vol.Schema(options)
+        )
+
+    async def async_step_integration_discovery(self, discovery_info):
+        """Set up a device selected in another flow's discovery results"""
+        self.host = discovery_info[CONF_HOST]
+        await self.async_set_unique_id(self.host)
+        self._abort_if_unique_id_configured()
+        self.context["title_placeholders"] = {CONF_HOST: self.host}
+        return await self.async_step_user()
+
     async def async_step_device_effects(self, user_input=None):
         """Set which effects to add to device"""
         if user_input is not None:
@@ -87,6 +146,7 @@ class CololightOptionsFlowHandler(config_entries.OptionsFlow):
     def __init__(self, config_entry):
         """Initialize Cololight options flow."""
         self.options = dict(config_entry.options)
+        self.device = config_entry.data.get("device", "hexagon")
         self.cololight = None
         self._errors = {}
 
@@ -94,20 +154,10 @@ class CololightOptionsFlowHandler(config_entries.OptionsFlow):
         self.cololight = self.hass.data["cololight"][self.config_entry.entry_id]
 
     def _get_color_schemes(self):
-        color_schemes = []
-        for color_scheme in self.cololight.custom_effect_colour_schemes():
-            for color in self.cololight.custom_effect_colour_scheme_colours(
-                color_scheme
-            ):
-                color_schemes.append(f"{color_scheme} | {color}")
-
-        return color_schemes
+        return colour_scheme_labels(self.device)
 
     def _split_color_scheme(self, color_scheme):
-        split_color_scheme = color_scheme.split(" | ")
-        color_scheme = split_color_scheme[0]
-        color = split_color_scheme[1]
-        return color_scheme, color
+        return colour_scheme_catalogue(self.device)[color_scheme]
 
     def _get_effects(self):
         return dict(zip(self.cololight.effects, self.cololight.effects))
@@ -145,7 +195,12 @@ class CololightOptionsFlowHandler(config_entries.OptionsFlow):
         self._get_cololight()
         return self.async_show_menu(
             step_id="init",
-            menu_options=["create_effect", "remove_effect", "restore_effect"],
+            menu_options=[
+                "create_effect",
+                "remove_effect",
+                "restore_effect",
+                "rate_limit",
+            ],
         )
 
     async def async_step_create_effect(self, user_input=None):
@@ -157,12 +212,15 @@ class CololightOptionsFlowHandler(config_entries.OptionsFlow):
                 )
                 self.options.update(
                     {
-                        user_input[CONF_NAME]: {
-                            "color_scheme": color_scheme,
-                            "color": color,
-                            "cycle_speed": user_input["cycle_speed"],
-                            CONF_MODE: user_input[CONF_MODE],
-                        }
+                        user_input[CONF_NAME]: encode_custom_effect(
+                            self.device,
+                            {
+                                "color_scheme": color_scheme,
+                                "color": color,
+                                "cycle_speed": user_input["cycle_speed"],
+                                CONF_MODE: user_input[CONF_MODE],
+                            },
+                        )
                     }
                 )
                 return self.async_create_entry(title="", data=self.options)
@@ -262,3 +320,26 @@ class CololightOptionsFlowHandler(config_entries.OptionsFlow):
             step_id="restore_effect",
             data_schema=vol.Schema(options),
         )
+
+    async def async_step_rate_limit(self, user_input=None):
+        if user_input is not None:
+            self.options.update(user_input)
+            return self.async_create_entry(title="", data=self.options)
+
+        rate, burst = RATE_LIMITS[self.device]
+        options = {
+            vol.Required(
+                "command_interval",
+                default=self.options.get("command_interval", DEFAULT_COMMAND_INTERVAL),
+            ): vol.All(vol.Coerce(float), vol.Range(min=0, max=5)),
+            vol.Required(
+                "rate_limit", default=self.options.get("rate_limit", rate)
+            ): vol.All(vol.Coerce(float), vol.Range(min=1, max=100)),
+            vol.Required(
+                "rate_burst", default=self.options.get("rate_burst", burst)
+            ): vol.All(vol.Coerce(int), vol.Range(min=1, max=50)),
+        }
+
+        return self.async_show_form(
+            step_id="rate_limit", data_schema=vol.Schema(options)
+        )
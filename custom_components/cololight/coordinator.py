@@ -0,0 +1,146 @@
+"""Polling coordinator for Cololight devices."""
+import asyncio
+import logging
+import random
+from datetime import timedelta
+
+from pycololight import UnavailableException
+
+from homeassistant import config_entries
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_call_later
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
+import homeassistant.util.dt as dt_util
+
+_LOGGER = logging.getLogger(__name__)
+
+SCAN_INTERVAL = timedelta(seconds=30)
+MAX_SCAN_INTERVAL = timedelta(minutes=5)
+CONFIRM_DELAY = timedelta(seconds=1)
+STABLE_BACKOFF = 1.5
+UNAVAILABLE_BACKOFF = 2
+
+
+class CololightCoordinator(DataUpdateCoordinator):
+    """
+    Polls every Cololight device in one pass.
+
+    State queries are sent concurrently, so a poll takes about one network
+    round trip however many devices are configured. Data maps each device host
+    polled in the pass to its state, the exception raised when querying it, or
+    None when the query was skipped or cancelled for a command.
+
+    Each device has its own poll interval. It is polled shortly after a command
+    to confirm its state, backed off gradually while its state is unchanged,
+    and backed off exponentially (with jitter) while it is unavailable.
+    """
+
+    def __init__(self, hass):
+        # Shared by every entry, so not bound to (and shut down with) the entry
+        # being set up when it is created
+        token = config_entries.current_entry.set(None)
+        try:
+            super().__init__(
+                hass, _LOGGER, name="cololight", update_interval=SCAN_INTERVAL
+            )
+        finally:
+            config_entries.current_entry.reset(token)
+        self.devices = {}
+        self._intervals = {}
+        self._next_poll = {}
+        self._failures = {}
+        self._last_states = {}
+        self._cancel_confirm = None
+
+    @callback
+    def async_add_device(self, device):
+        """Add a device to be polled, returning a callback to remove it."""
+        host = device.host
+        self.devices[host] = device
+        self._intervals[host] = SCAN_INTERVAL
+        self._next_poll[host] = dt_util.utcnow()
+        # The poll interval may be backed off well past a new device's due time
+        self._async_schedule_poll()
+
+        @callback
+        def remove_device():
+            for data in (
+                self.devices,
+                self._intervals,
+                self._next_poll,
+                self._failures,
+                self._last_states,
+            ):
+                data.pop(host, None)
+
+        return remove_device
+
+    @callback
+    def async_confirm_device(self, host):
+        """Poll a device shortly after a command, to confirm its new state."""
+        if host not in self.devices:
+            return
+
+        self._intervals[host] = SCAN_INTERVAL
+        self._next_poll[host] = dt_util.utcnow() + CONFIRM_DELAY
+        self._async_schedule_poll()
+
+    @callback
+    def _async_schedule_poll(self):
+        if self._cancel_confirm is None:
+            self._cancel_confirm = async_call_later(
+                self.hass, CONFIRM_DELAY, self._async_confirm
+            )
+
+    async def _async_confirm(self, _now):
+        self._cancel_confirm = None
+        await self.async_refresh()
+
+    async def async_shutdown(self):
+        if self._cancel_confirm is not None:
+            self._cancel_confirm()
+            self._cancel_confirm = None
+        await super().async_shutdown()
+
+    def _next_interval(self, host, state):
+        if isinstance(state, UnavailableException):
+            failures = self._failures[host] = self._failures.get(host, 0) + 1
+            interval = min(
+                SCAN_INTERVAL * UNAVAILABLE_BACKOFF**failures, MAX_SCAN_INTERVAL
+            )
+            return interval * random.uniform(0.5, 1)
+
+        self._failures.pop(host, None)
+
+        if isinstance(state, Exception):
+            return SCAN_INTERVAL
+
+        reading = (state.on, state.brightness)
+        if self._last_states.get(host) != reading:
+            self._last_states[host] = reading
+            return SCAN_INTERVAL
+
+        return min(self._intervals[host] * STABLE_BACKOFF, MAX_SCAN_INTERVAL)
+
+    async def _async_update_data(self):
+        now = dt_util.utcnow()
+        hosts = [
+            host for host, next_poll in self._next_poll.items() if next_poll <= now
+        ]
+        results = await asyncio.gather(
+            *(self.devices[host].async_get_state() for host in hosts),
+            return_exceptions=True,
+        )
+
+        for host, state in zip(hosts, results):
+            if host not in self.devices or state is None:
+                # No reading, polled again shortly or by a command's confirmation
+                continue
+            interval = self._next_interval(host, state)
+            self._intervals[host] = interval
+            self._next_poll[host] = now + interval
+
+        next_poll = min(self._next_poll.values(), default=now + SCAN_INTERVAL)
+        self.update_interval = max(next_poll - now, CONFIRM_DELAY)
+
+        return dict(zip(hosts, results))
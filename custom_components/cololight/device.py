@@ -0,0 +1,648 @@
+"""Async command path for Cololight devices."""
+import asyncio
+import itertools
+import logging
+from functools import partial
+from dataclasses import dataclass, replace
+from typing import NamedTuple
+
+from pycololight import BrightnessException, UnavailableException
+
+from .effects import saved_effect_commands
+from .packets import (
+    BRIGHTNESS_PACKETS,
+    OFF_PACKETS,
+    STATE_PACKETS,
+    colour_packet_table,
+    effect_packet_table,
+    next_counter,
+)
+from .transport import DEFAULT_PORT
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_COMMAND_INTERVAL = 0.1
+
+# Packets per second and burst size allowed to each device type. Strip
+# dynamic effects take up to 9 packets, hexagon commands at most 2.
+RATE_LIMITS = {
+    "hexagon": (10, 6),
+    "strip": (20, 18),
+}
+
+# Operations waiting for a device, beyond which callers wait to queue
+DEVICE_QUEUE_SIZE = 16
+
+PRIORITY_COMMAND = 0
+PRIORITY_QUERY = 1
+
+# Polls this soon after a command are skipped, the command's confirmation
+# poll (see CololightCoordinator) comes later
+POLL_GRACE_PERIOD = 0.5
+
+# Seconds a reading suppresses commands that would not change it, after which
+# the device may have been changed by its remote or app
+CONFIRMED_MAX_AGE = 5
+
+QUERY_TIMEOUT = 0.3
+QUERY_ATTEMPTS = 3
+QUERY_HEDGE_DELAY = 0.1
+
+BREAKER_THRESHOLD = 3
+BREAKER_RESET_TIMEOUT = 30
+BREAKER_PROBE_TIMEOUT = 1
+
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+
+@dataclass(frozen=True)
+class CololightCommand:
+    """Desired state of a device."""
+
+    on: bool
+    brightness: int = None
+    colour: tuple = None
+    effect: str = None
+
+    def merge(self, command):
+        """
+        Combine a newer command with this pending one.
+
+        The newer command wins, but keeps a pending colour or effect when it only
+        changes brightness.
+        """
+        if not self.on or not command.on:
+            return command
+        if command.colour is None and command.effect is None:
+            return replace(command, colour=self.colour, effect=self.effect)
+        return command
+
+    def is_redundant(self, current):
+        """Return if sending this command would not change the current state."""
+        if current is None or self.on != current.on:
+            return False
+        if not self.on:
+            return True
+        return (
+            self.brightness == current.brightness
+            and self.colour in (None, current.colour)
+            and self.effect in (None, current.effect)
+        )
+
+
+class CololightState(NamedTuple):
+    """
+    State read from a device.
+
+    Sequence is the last command sent before the device was queried.
+    """
+
+    on: bool
+    brightness: int
+    sequence: int
+
+
+class TokenBucket:
+    """
+    Limits the packets sent to a device, commands and state queries alike.
+
+    Tokens refill at rate per second up to burst. A send may overdraw the
+    bucket, later sends then wait until the balance is positive again.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = None
+
+    def _refill(self, now):
+        if self._updated is not None:
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+        self._updated = now
+
+    def delay(self, now):
+        """Return how long to wait before the next send."""
+        self._refill(now)
+        return 0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+
+    def spend(self, packets, now):
+        self._refill(now)
+        self._tokens -= packets
+
+
+class CololightDevice:
+    """
+    Sends commands to a Cololight device without blocking the event loop.
+
+    All I/O with the device goes through one priority queue, worked by a
+    single task while there is anything queued. Commands are sent in the order
+    they were made, ahead of any queued state queries. A command also cancels
+    a query waiting on its reply, so it is not held up by a poll timing out.
+
+    Payloads are encoded the same way as PyCololight, which remains the source
+    of the device type and saved effects.
+    """
+
+    def __init__(
+        self,
+        light,
+        host,
+        transport,
+        port=DEFAULT_PORT,
+        timeout=QUERY_TIMEOUT,
+        attempts=QUERY_ATTEMPTS,
+        hedge_delay=QUERY_HEDGE_DELAY,
+        command_interval=DEFAULT_COMMAND_INTERVAL,
+        poll_grace=POLL_GRACE_PERIOD,
+        rate_limit=None,
+    ):
+        self.light = light
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.attempts = attempts
+        self.hedge_delay = hedge_delay
+        self.poll_grace = poll_grace
+        self.rate_limit = None
+        self.set_rate_limit(command_interval, rate_limit)
+        self._transport = transport
+        self._address = None
+        self._counter = 1
+        self._queue = asyncio.PriorityQueue(DEVICE_QUEUE_SIZE)
+        self._order = itertools.count()
+        self._worker = None
+        self._current = None
+        self._pending = None
+        self._pending_waiters = []
+        self._send_queued = False
+        self._send_generation = 0
+        self._send_waiting = False
+        self._last_sent = None
+        self.command_sequence = 0
+        self.sent_sequence = 0
+        self._sent_command = None
+        self._confirmed = None
+        self._confirmed_at = None
+        self.suppressed_commands = 0
+        self.breaker_state = BREAKER_CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self.refresh_effects()
+
+    def set_rate_limit(self, command_interval, rate_limit=None):
+        """
+        Set the interval between commands and the packet rate limit.
+
+        rate_limit is (packets per second, burst), by default that of the
+        device type. The bucket is only replaced when the limit changes.
+        """
+        self.command_interval = command_interval
+        rate, burst = rate_limit or RATE_LIMITS[self.light.device]
+        bucket = self.rate_limit
+        if bucket is None or bucket.rate != rate or bucket.burst != burst:
+            self.rate_limit = TokenBucket(rate, burst)
+
+    def _next_counter(self, packet_count=1):
+        counter = self._counter
+        if packet_count % 2:
+            self._counter = next_counter(counter)
+        return counter
+
+    def refresh_effects(self):
+        """Forget looked up effect packets, after the saved effects change."""
+        # Packets are looked up on first use of each effect
+        self._effect_packets = {}
+
+    def brightness_packet(self, brightness):
+        if not 0 <= brightness <= 100:
+            raise BrightnessException
+        return BRIGHTNESS_PACKETS[int(brightness)][self._next_counter() - 1]
+
+    def off_packet(self):
+        return OFF_PACKETS[self._next_counter() - 1]
+
+    def colour_packet(self, colour):
+        return colour_packet_table(tuple(colour))[self._next_counter() - 1]
+
+    def state_packet(self):
+        return STATE_PACKETS[self._next_counter() - 1]
+
+    def effect_packets(self, effect):
+        table = self._effect_packets.get(effect)
+        if table is None:
+            table = self._effect_packets[effect] = effect_packet_table(
+                saved_effect_commands(self.light, effect)
+            )
+        packets = table[self._counter - 1]
+        self._next_counter(len(packets))
+        return packets
+
+    async def async_address(self):
+        """Return the device's IP address, resolving its host on first use."""
+        if self._address is None:
+            self._address = await self._transport.async_resolve(self.host, self.port)
+        return self._address
+
+    async def async_send(self, packets):
+        address = await self.async_address()
+        await self._transport.async_send(address, packets, self.port)
+
+    def command_packets(self, command):
+        """
+        Encode the whole desired state of a command.
+
+        The protocol has no single packet combining colour or effect with
+        brightness, so this is the colour/effect packets followed by brightness.
+        """
+        if not command.on:
+            return [self.off_packet()]
+
+        packets = []
+        if command.colour:
+            packets.append(self.colour_packet(command.colour))
+
+        if command.effect:
+            packets.extend(self.effect_packets(command.effect))
+
+        packets.append(self.brightness_packet(command.brightness))
+        return packets
+
+    async def _async_send_command(self, command):
+        # Send all packets back to back, so the device changes in one step
+        packets = self.command_packets(command)
+        self.rate_limit.spend(len(packets), asyncio.get_running_loop().time())
+        await self.async_send(packets)
+
+    async def _async_wait_rate_limit(self):
+        loop = asyncio.get_running_loop()
+        delay = self.rate_limit.delay(loop.time())
+        while delay > 0:
+            await asyncio.sleep(delay)
+            delay = self.rate_limit.delay(loop.time())
+
+    def _spend_query_packet(self):
+        self.rate_limit.spend(1, asyncio.get_running_loop().time())
+
+    async def _async_run(self):
+        loop = asyncio.get_running_loop()
+        while not self._queue.empty():
+            priority, _, operation, waiter = self._queue.get_nowait()
+            task = loop.create_task(operation())
+            self._current = (priority, task)
+            try:
+                await asyncio.wait((task,))
+            finally:
+                self._current = None
+
+            exc = None if task.cancelled() else task.exception()
+            if waiter is None or waiter.done():
+                continue
+            if task.cancelled():
+                waiter.set_result(None)
+            elif exc is not None:
+                waiter.set_exception(exc)
+            else:
+                waiter.set_result(task.result())
+
+    async def _async_submit(self, operation, priority, waiter=None):
+        """Queue an operation, waiting for room when the queue is full."""
+        await self._queue.put((priority, next(self._order), operation, waiter))
+        if priority == PRIORITY_COMMAND:
+            self._cancel_query()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.get_running_loop().create_task(self._async_run())
+
+    def _cancel_query(self):
+        if self._current is not None and self._current[0] == PRIORITY_QUERY:
+            self._current[1].cancel()
+
+    async def _async_send_pending(self, generation):
+        if generation != self._send_generation:
+            # The pending command was taken over by async_command_all
+            return
+
+        loop = asyncio.get_running_loop()
+        self._send_waiting = True
+        try:
+            if self._last_sent is not None:
+                delay = self._last_sent + self.command_interval - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            # Commands made while waiting for the rate limit are merged
+            await self._async_wait_rate_limit()
+        finally:
+            self._send_waiting = False
+
+        self._send_queued = False
+
+        command, self._pending = self._pending, None
+        waiters, self._pending_waiters = self._pending_waiters, []
+        sequence = self.command_sequence
+        try:
+            await self._async_send_command(command)
+            self._command_sent(command, sequence)
+        except Exception as exc:
+            self._command_failed(sequence)
+            _fail_waiters(waiters, exc)
+        except asyncio.CancelledError as exc:
+            self._command_failed(sequence)
+            _fail_waiters(waiters, exc)
+            raise
+        else:
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+        self._last_sent = loop.time()
+
+    def _command_sent(self, command, sequence):
+        self.sent_sequence = sequence
+        self._sent_command = command
+        self._confirmed = None
+
+    def _command_failed(self, sequence):
+        # The device kept its state, so later readings are current again
+        self.sent_sequence = sequence
+        self._sent_command = None
+        self._confirmed = None
+
+    def _update_confirmed(self, state):
+        """
+        Track the device state confirmed by a reading.
+
+        A reading matching the last command sent confirms its colour and
+        effect too, otherwise only the on state and brightness are known.
+        """
+        if state.sequence != self.sent_sequence:
+            # A command was sent while the query was in flight
+            return
+
+        sent = self._sent_command
+        if (
+            sent is not None
+            and sent.on == state.on
+            and (not state.on or sent.brightness == state.brightness)
+        ):
+            self._confirmed = sent
+        else:
+            self._confirmed = CololightCommand(state.on, state.brightness)
+        self._confirmed_at = asyncio.get_running_loop().time()
+
+    def _take_pending(self, command):
+        """Merge any pending command into command, taking over its waiters."""
+        self.command_sequence += 1
+        waiters = []
+        if self._pending is not None:
+            command = self._pending.merge(command)
+            waiters, self._pending_waiters = self._pending_waiters, []
+            self._pending = None
+
+        # The queued send of the pending command is now stale, later commands
+        # queue a send of their own
+        self._send_generation += 1
+        self._send_queued = False
+        if self._send_waiting:
+            self._current[1].cancel()
+        return command, waiters
+
+    async def _async_hold(self, ready, release):
+        """Hold the queue for async_command_all, until its send is released."""
+        try:
+            address = await self.async_address()
+        except Exception as exc:
+            if not ready.done():
+                ready.set_exception(exc)
+            raise
+        if not ready.done():
+            ready.set_result(address)
+        await release
+
+    async def async_command(self, command):
+        """
+        Queue a command for the device.
+
+        Commands arriving within command_interval of the last send, or while
+        the device's rate limit is exhausted, are merged so only the newest
+        desired state is sent. Returns True once it has been sent.
+
+        Commands that would not change the state confirmed by a poll in the
+        last CONFIRMED_MAX_AGE seconds are not sent, counted in
+        suppressed_commands, and return False.
+        """
+        loop = asyncio.get_running_loop()
+        if (
+            self._pending is None
+            and not self._send_queued
+            and command.is_redundant(self._confirmed)
+            and loop.time() - self._confirmed_at < CONFIRMED_MAX_AGE
+        ):
+            self.suppressed_commands += 1
+            _LOGGER.debug("Cololight %s already in the commanded state", self.host)
+            return False
+
+        self.command_sequence += 1
+        if self._pending is not None:
+            command = self._pending.merge(command)
+        self._pending = command
+        waiter = loop.create_future()
+        self._pending_waiters.append(waiter)
+
+        if not self._send_queued:
+            self._send_queued = True
+            await self._async_submit(
+                partial(self._async_send_pending, self._send_generation),
+                PRIORITY_COMMAND,
+            )
+
+        await waiter
+        return True
+
+    async def async_turn_on(self, brightness, colour=None, effect=None):
+        """Turn the device on, optionally setting a colour or effect first."""
+        return await self.async_command(
+            CololightCommand(True, brightness, colour, effect)
+        )
+
+    async def async_turn_off(self):
+        return await self.async_command(CololightCommand(False))
+
+    async def async_get_state(self):
+        """
+        Query the device, returning its on state and brightness (0-100).
+
+        The query is queued behind any commands. Each attempt waits up to
+        timeout for a reply, sending a duplicate query if none has arrived
+        after hedge_delay. UnavailableException is raised once every attempt
+        has failed. Query packets, duplicates included, count against the rate
+        limit, and an attempt waits for it like a command does.
+
+        Returns None when the reply is not recognised, or the query was
+        skipped or cancelled for a command.
+        """
+        waiter = asyncio.get_running_loop().create_future()
+        await self._async_submit(self._async_query, PRIORITY_QUERY, waiter)
+        return await waiter
+
+    async def _async_query(self):
+        loop = asyncio.get_running_loop()
+        if (
+            self._last_sent is not None
+            and loop.time() - self._last_sent < self.poll_grace
+        ):
+            return None
+
+        try:
+            attempts, timeout = self._breaker_attempts()
+            sequence = self.sent_sequence
+            packet = self.state_packet()
+            for attempt in range(attempts):
+                try:
+                    address = await self.async_address()
+                    await self._async_wait_rate_limit()
+                    data = await self._transport.async_request(
+                        address,
+                        packet,
+                        timeout,
+                        self.port,
+                        self.hedge_delay,
+                        self._spend_query_packet,
+                    )
+                    break
+                except UnavailableException:
+                    if attempt == attempts - 1:
+                        # Resolved again next time, in case the address changed
+                        self._address = None
+                        self._breaker_failure()
+                        raise
+        except UnavailableException:
+            # The device's state is no longer known
+            self._confirmed = None
+            raise
+        except asyncio.CancelledError:
+            if self.breaker_state == BREAKER_HALF_OPEN:
+                # Probe again on the next poll
+                self.breaker_state = BREAKER_OPEN
+            raise
+        self._breaker_success()
+
+        if data[40] == 207:
+            state = CololightState(True, data[41], sequence)
+        elif data[40] == 206:
+            state = CololightState(False, None, sequence)
+        else:
+            return None
+
+        self._update_confirmed(state)
+        return state
+
+    def _breaker_attempts(self):
+        """
+        Return the number of attempts and timeout for the next state query.
+
+        After BREAKER_THRESHOLD consecutive failed queries the breaker opens
+        and queries fail straight away. Once BREAKER_RESET_TIMEOUT has passed
+        a single probe attempt is allowed through.
+        """
+        if self.breaker_state == BREAKER_CLOSED:
+            return self.attempts, self.timeout
+
+        loop = asyncio.get_running_loop()
+        if (
+            self.breaker_state == BREAKER_OPEN
+            and loop.time() - self._opened_at >= BREAKER_RESET_TIMEOUT
+        ):
+            self.breaker_state = BREAKER_HALF_OPEN
+            return 1, BREAKER_PROBE_TIMEOUT
+
+        raise UnavailableException
+
+    def _breaker_failure(self):
+        self._failures += 1
+        if (
+            self.breaker_state == BREAKER_HALF_OPEN
+            or self._failures >= BREAKER_THRESHOLD
+        ):
+            self.breaker_state = BREAKER_OPEN
+            self._opened_at = asyncio.get_running_loop().time()
+
+    def _breaker_success(self):
+        self._failures = 0
+        self.breaker_state = BREAKER_CLOSED
+
+    def is_current(self, state):
+        """Return if a state was read after every queued command was sent."""
+        return state.sequence == self.command_sequence
+
+
+def _fail_waiters(waiters, exc):
+    """Fail the waiters of a command that was not sent, or cancel them with it."""
+    for waiter in waiters:
+        if waiter.done():
+            continue
+        if isinstance(exc, asyncio.CancelledError):
+            waiter.cancel()
+        else:
+            waiter.set_exception(exc)
+
+
+async def async_command_all(transport, commands):
+    """
+    Send commands to several devices in a single pass of the event loop.
+
+    Commands maps each CololightDevice to its command. The send is queued on
+    each device like any other command, and made once it has reached the front
+    of every device's queue, so every device changes at the same moment. A
+    command pending for a device is merged in and sent with it, without
+    waiting for the command interval or rate limit. The packets still count
+    against each device's rate limit.
+    """
+    loop = asyncio.get_running_loop()
+    release = loop.create_future()
+    readies = []
+    claimed = []
+    try:
+        for device, command in commands.items():
+            ready = loop.create_future()
+            readies.append(ready)
+            await device._async_submit(
+                partial(device._async_hold, ready, release), PRIORITY_COMMAND
+            )
+            # Claimed once queued, so commands made later are sent after it
+            command, waiters = device._take_pending(command)
+            claimed.append((device, command, device.command_sequence, waiters))
+
+        addresses = await asyncio.gather(*readies, return_exceptions=True)
+        for address in addresses:
+            if isinstance(address, Exception):
+                raise address
+
+        sends = []
+        now = loop.time()
+        for address, (device, command, _, _) in zip(addresses, claimed):
+            packets = device.command_packets(command)
+            device.rate_limit.spend(len(packets), now)
+            sends.append((address, packets, device.port))
+
+        await transport.async_send_many(sends)
+    except (Exception, asyncio.CancelledError) as exc:
+        for device, _, sequence, waiters in claimed:
+            device._command_failed(sequence)
+            _fail_waiters(waiters, exc)
+        raise
+    finally:
+        # Lets each device's queue move on
+        if not release.done():
+            release.set_result(None)
+
+    sent_at = loop.time()
+    for device, command, sequence, waiters in claimed:
+        device._command_sent(command, sequence)
+        device._last_sent = sent_at
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
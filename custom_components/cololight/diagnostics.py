@@ -0,0 +1,32 @@
+"""Diagnostics of Cololight config entries."""
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_HOST
+from homeassistant.core import HomeAssistant
+
+from . import DOMAIN, DATA_ENTITIES
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry):
+    """
+    Return the entry and the state of its device's command path.
+
+    Counters are kept here rather than as entity attributes, so they do not
+    cause state writes.
+    """
+    diagnostics = {"data": dict(entry.data), "options": dict(entry.options)}
+
+    for entity in hass.data.get(DOMAIN, {}).get(DATA_ENTITIES, {}).values():
+        if entity._host != entry.data[CONF_HOST]:
+            continue
+        device = entity._device
+        diagnostics["device"] = {
+            "breaker_state": device.breaker_state,
+            "suppressed_commands": device.suppressed_commands,
+            "command_interval": device.command_interval,
+            "rate_limit": device.rate_limit.rate,
+            "rate_burst": device.rate_limit.burst,
+            "command_sequence": device.command_sequence,
+            "sent_sequence": device.sent_sequence,
+        }
+
+    return diagnostics
@@ -0,0 +1,117 @@
+"""Network discovery of Cololight devices."""
+import asyncio
+import ipaddress
+import logging
+
+from pycololight import UnavailableException
+
+from homeassistant.components import network
+
+from .packets import STATE_PACKETS
+from .transport import DEFAULT_PORT, CololightTransport
+
+_LOGGER = logging.getLogger(__name__)
+
+DISCOVERY_TIMEOUT = 1
+DISCOVERY_CONCURRENCY = 64
+DISCOVERY_BATCH_DELAY = 0.01
+
+PROBE_TIMEOUT = 1
+PROBE_HEDGE_DELAY = 0.25
+
+# Larger networks are only swept around the adapter's own /24
+MIN_SWEEP_PREFIX = 24
+
+
+def is_state_reply(data):
+    return len(data) > 41 and data[40] in (206, 207)
+
+
+class DiscoveryProtocol(asyncio.DatagramProtocol):
+    """Collects the addresses of devices replying to a state query."""
+
+    def __init__(self):
+        self.hosts = set()
+
+    def datagram_received(self, data, addr):
+        if is_state_reply(data):
+            self.hosts.add(addr[0])
+
+    def error_received(self, exc):
+        _LOGGER.debug("Cololight discovery error: %s", exc)
+
+
+async def async_discover_hosts(
+    networks,
+    timeout=DISCOVERY_TIMEOUT,
+    concurrency=DISCOVERY_CONCURRENCY,
+    port=DEFAULT_PORT,
+):
+    """
+    Return the hosts of Cololight devices found on the given networks.
+
+    A state query is broadcast on each network and also sent to every host,
+    at most concurrency packets at a time, for devices that ignore broadcasts.
+    Replies are collected until timeout after the last query was sent.
+    """
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.create_datagram_endpoint(
+        DiscoveryProtocol, local_addr=("0.0.0.0", 0), allow_broadcast=True
+    )
+    packet = STATE_PACKETS[0]
+
+    try:
+        for ip_network in networks:
+            if ip_network.num_addresses > 2:
+                transport.sendto(packet, (str(ip_network.broadcast_address), port))
+
+        hosts = [str(host) for ip_network in networks for host in ip_network.hosts()]
+        for start in range(0, len(hosts), concurrency):
+            for host in hosts[start : start + concurrency]:
+                transport.sendto(packet, (host, port))
+            await asyncio.sleep(DISCOVERY_BATCH_DELAY)
+
+        await asyncio.sleep(timeout)
+    finally:
+        transport.close()
+
+    return sorted(protocol.hosts, key=ipaddress.ip_address)
+
+
+async def async_discover(hass, timeout=DISCOVERY_TIMEOUT):
+    """Discover Cololight devices on the networks of Home Assistant's adapters."""
+    networks = set()
+    for adapter in await network.async_get_adapters(hass):
+        if not adapter["enabled"]:
+            continue
+        for ipv4 in adapter["ipv4"]:
+            prefix = max(ipv4["network_prefix"], MIN_SWEEP_PREFIX)
+            ip_network = ipaddress.ip_network(
+                f"{ipv4['address']}/{prefix}", strict=False
+            )
+            if not ip_network.is_loopback:
+                networks.add(ip_network)
+
+    if not networks:
+        return []
+
+    try:
+        return await async_discover_hosts(sorted(networks), timeout)
+    except OSError as exc:
+        _LOGGER.debug("Unable to discover Cololight devices: %s", exc)
+        return []
+
+
+async def async_probe(host, timeout=PROBE_TIMEOUT):
+    """Return whether a Cololight device replies to a state query at host."""
+    transport = CololightTransport()
+    try:
+        reply = await transport.async_request(
+            host, STATE_PACKETS[0], timeout, hedge_delay=PROBE_HEDGE_DELAY
+        )
+    except (UnavailableException, OSError):
+        return False
+    finally:
+        transport.close()
+
+    return is_state_reply(reply)
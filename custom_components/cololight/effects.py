@@ -0,0 +1,107 @@
+"""Effect definitions shared by every Cololight device."""
+from functools import lru_cache
+from types import MappingProxyType
+
+from pycololight import DefaultEffectExecption
+from pycololight.effects import Effects
+
+CUSTOM_EFFECT_CACHE_SIZE = 1024
+
+# Entry options that are not custom effects
+NON_EFFECT_OPTIONS = [
+    "removed_effects",
+    "restored_effects",
+    "default_effects",  # legacy options item
+    "command_interval",
+    "rate_limit",
+    "rate_burst",
+]
+
+
+@lru_cache(maxsize=None)
+def device_effects(device):
+    """Return the pycololight effects of a device type."""
+    return Effects(device)
+
+
+def saved_effects(device, names):
+    """
+    Return the commands of default and dynamic effects of a device type.
+
+    Raises DefaultEffectExecption for an unknown name, like
+    PyCololight.restore_effects.
+    """
+    effects = device_effects(device).effects
+    if any(name not in effects for name in names):
+        raise DefaultEffectExecption
+    return {name: effects[name] for name in names}
+
+
+# PyCololight keeps the effects saved on a light privately, with no public
+# way to read an effect's commands or to replace the saved effects
+def saved_effect_commands(light, effect):
+    """Return the commands of an effect saved on a PyCololight."""
+    return light._effects[effect]
+
+
+def replace_saved_effects(light, effects):
+    """Replace the effects saved on a PyCololight, returning whether they changed."""
+    changed = light._effects != effects
+    light._effects = effects
+    return changed
+
+
+@lru_cache(maxsize=None)
+def colour_scheme_catalogue(device):
+    """
+    Return the colours available to custom effects of a device type.
+
+    Maps each "scheme | colour" label shown in the options flow to its
+    (scheme, colour) pair. Built once per device type and read-only.
+    """
+    effects = device_effects(device)
+    return MappingProxyType(
+        {
+            f"{colour_scheme} | {colour}": (colour_scheme, colour)
+            for colour_scheme in effects.custom_effect_colour_schemes()
+            for colour in effects.custom_effect_colour_scheme_colours(colour_scheme)
+        }
+    )
+
+
+@lru_cache(maxsize=None)
+def colour_scheme_labels(device):
+    """Return the "scheme | colour" labels of a device type, in catalogue order."""
+    return tuple(colour_scheme_catalogue(device))
+
+
+@lru_cache(maxsize=CUSTOM_EFFECT_CACHE_SIZE)
+def custom_effect_commands(device, colour_scheme, colour, cycle_speed, mode):
+    """
+    Return the commands of a custom effect.
+
+    Options are validated and encoded once, then shared by every device using
+    the same custom effect. Raises the same exceptions as
+    PyCololight.add_custom_effect.
+    """
+    return (
+        device_effects(device).custom_effect_command(
+            colour_scheme, colour, cycle_speed, mode
+        ),
+    )
+
+
+def encode_custom_effect(device, effect_options):
+    """
+    Return custom effect options with their encoded commands added.
+
+    Stored commands let setup load the effect without validating it again.
+    """
+    commands = custom_effect_commands(
+        device,
+        effect_options["color_scheme"],
+        effect_options["color"],
+        effect_options["cycle_speed"],
+        effect_options["mode"],
+    )
+    return {**effect_options, "commands": list(commands)}
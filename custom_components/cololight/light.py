@@ -1,6 +1,7 @@
 """Platform for LifeSmart ColoLight Light integration."""
 import logging
-from datetime import timedelta
+
+import voluptuous as vol
 
 from pycololight import (
     PyCololight,
@@ -33,11 +34,43 @@ except ImportError:
         ColorMode,
     )
 
-from homeassistant.const import CONF_HOST, CONF_NAME, CONF_MODE, STATE_ON
+from homeassistant.const import (
+    ATTR_ENTITY_ID,
+    CONF_HOST,
+    CONF_NAME,
+    CONF_MODE,
+    CONF_STATE,
+    STATE_OFF,
+    STATE_ON,
+)
+from homeassistant.core import callback
+from homeassistant.exceptions import HomeAssistantError
+import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
 from homeassistant.helpers.restore_state import RestoreEntity
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
 import homeassistant.util.color as color_util
 
-from . import DOMAIN
+from . import (
+    DOMAIN,
+    DATA_COORDINATOR,
+    DATA_ENTITIES,
+    DATA_TRANSPORT,
+    SERVICE_APPLY,
+    SIGNAL_OPTIONS_UPDATED,
+)
+from .device import (
+    DEFAULT_COMMAND_INTERVAL,
+    CololightCommand,
+    CololightDevice,
+    async_command_all,
+)
+from .effects import (
+    NON_EFFECT_OPTIONS,
+    custom_effect_commands,
+    replace_saved_effects,
+    saved_effects,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -47,23 +80,31 @@ DEFAULT_ICON = "mdi:hexagon-multiple"
 HEXAGON_ICON = "mdi:hexagon-multiple"
 STRIP_ICON = "mdi:led-strip-variant"
 
-SCAN_INTERVAL = timedelta(seconds=30)
+APPLY_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_ENTITY_ID): cv.entity_ids,
+        vol.Optional(CONF_STATE, default=STATE_ON): vol.In([STATE_ON, STATE_OFF]),
+        vol.Optional(ATTR_BRIGHTNESS): vol.All(
+            vol.Coerce(int), vol.Range(min=0, max=255)
+        ),
+        vol.Exclusive(ATTR_HS_COLOR, "colour"): vol.All(
+            vol.ExactSequence(
+                (
+                    vol.All(vol.Coerce(float), vol.Range(min=0, max=360)),
+                    vol.All(vol.Coerce(float), vol.Range(min=0, max=100)),
+                )
+            ),
+            vol.Coerce(tuple),
+        ),
+        vol.Exclusive(ATTR_EFFECT, "colour"): cv.string,
+    }
+)
 
 
 async def async_setup_entry(hass, entry, async_add_entities):
     host = entry.data[CONF_HOST]
     name = entry.data[CONF_NAME]
     device = entry.data["device"] if "device" in entry.data else "hexagon"
-    effects = []
-
-    if DOMAIN not in hass.data:
-        hass.data[DOMAIN] = {}
-
-    if entry.data.get("default_effects"):
-        effects.extend(entry.data["default_effects"])
-
-    if entry.data.get("dynamic_effects"):
-        effects.extend(entry.data["dynamic_effects"])
 
     cololight_light = PyCololight(
         device=device,
@@ -72,24 +113,126 @@ async def async_setup_entry(hass, entry, async_add_entities):
         default_effects=False,
         dynamic_effects=False,
     )
+    load_effects(cololight_light, entry)
+
+    hass.data[DOMAIN][entry.entry_id] = cololight_light
+    cololight_device = CololightDevice(
+        cololight_light, host, hass.data[DOMAIN][DATA_TRANSPORT]
+    )
+    load_rate_limit(cololight_device, entry)
+    coordinator = hass.data[DOMAIN][DATA_COORDINATOR]
+    light_entity = coloLight(coordinator, cololight_light, cololight_device, host, name)
+    async_add_entities([light_entity])
+
+    entry.async_on_unload(
+        async_dispatcher_connect(
+            hass,
+            SIGNAL_OPTIONS_UPDATED.format(entry.entry_id),
+            light_entity.async_update_options,
+        )
+    )
+
+    if not hass.services.has_service(DOMAIN, SERVICE_APPLY):
+
+        async def async_apply(call):
+            await async_apply_service(hass, call)
+
+        hass.services.async_register(
+            DOMAIN, SERVICE_APPLY, async_apply, schema=APPLY_SCHEMA
+        )
+
+
+async def async_apply_service(hass, call):
+    """
+    Set the same state on several lights at once.
+
+    Every device's packets are sent in one pass of the event loop, rather than
+    one light.turn_on call after another.
+    """
+    entities = hass.data[DOMAIN][DATA_ENTITIES]
+    effect = call.data.get(ATTR_EFFECT)
+    targets = []
+    for entity_id in call.data[ATTR_ENTITY_ID]:
+        entity = entities.get(entity_id)
+        if entity is None:
+            continue
+        if effect and effect not in entity.effect_list:
+            _LOGGER.error("Cololight %s has no effect '%s'", entity.name, effect)
+            continue
+        targets.append(entity)
+
+    if not targets:
+        return
+
+    on = call.data[CONF_STATE] == STATE_ON
+    brightness = call.data.get(ATTR_BRIGHTNESS)
+    hs_color = call.data.get(ATTR_HS_COLOR)
+    commands = {}
+    for entity in targets:
+        if on:
+            commands[entity._device] = entity._turn_on_command(
+                brightness, hs_color, effect
+            )
+        else:
+            commands[entity._device] = CololightCommand(False)
+
+    await async_command_all(hass.data[DOMAIN][DATA_TRANSPORT], commands)
+
+    for entity in targets:
+        if on:
+            entity._command_sent(True, brightness, hs_color, effect)
+        else:
+            entity._command_sent(False)
+
+
+def load_rate_limit(cololight_device, entry):
+    """Set the command interval and rate limit of a device from its config entry."""
+    rate_limit = None
+    if "rate_limit" in entry.options:
+        rate_limit = (entry.options["rate_limit"], entry.options["rate_burst"])
+
+    cololight_device.set_rate_limit(
+        entry.options.get("command_interval", DEFAULT_COMMAND_INTERVAL), rate_limit
+    )
+
+
+def load_effects(cololight_light, entry):
+    """
+    Set the saved effects of a light from its config entry.
+
+    The new effects are built first, so the light keeps its effects if that
+    fails. Returns whether the saved effects changed.
+    """
+    device = cololight_light.device
+    names = []
+
+    if entry.data.get("default_effects"):
+        names.extend(entry.data["default_effects"])
+
+    if entry.data.get("dynamic_effects"):
+        names.extend(entry.data["dynamic_effects"])
 
-    if effects:
-        cololight_light.restore_effects(effects)
+    effects = saved_effects(device, names)
 
     if entry.options:
         for effect_name, effect_options in entry.options.items():
-            if effect_name not in [
-                "removed_effects",
-                "restored_effects",
-                "default_effects",  # legacy options item
-            ]:
+            if effect_name not in NON_EFFECT_OPTIONS:
+                if "commands" in effect_options:
+                    # Validated and encoded when the effect was created
+                    effects[effect_name] = list(effect_options["commands"])
+                    continue
+
                 try:
-                    cololight_light.add_custom_effect(
-                        effect_name,
-                        effect_options["color_scheme"],
-                        effect_options["color"],
-                        effect_options["cycle_speed"],
-                        effect_options[CONF_MODE],
+                    # Custom effects are validated once and shared between
+                    # devices
+                    effects[effect_name] = list(
+                        custom_effect_commands(
+                            device,
+                            effect_options["color_scheme"],
+                            effect_options["color"],
+                            effect_options["cycle_speed"],
+                            effect_options[CONF_MODE],
+                        )
                     )
                 except ColourSchemeException:
                     _LOGGER.error(
@@ -130,17 +273,18 @@ async def async_setup_entry(hass, entry, async_add_entities):
                     )
                     continue
 
-    hass.data[DOMAIN][entry.entry_id] = cololight_light
-    async_add_entities([coloLight(cololight_light, host, name)])
+    return replace_saved_effects(cololight_light, effects)
 
 
-class coloLight(Light, RestoreEntity):
+class coloLight(CoordinatorEntity, Light, RestoreEntity):
 
     _attr_supported_color_modes = {ColorMode.HS}
     _attr_supported_features = LightEntityFeature.EFFECT
 
-    def __init__(self, light, host, name):
+    def __init__(self, coordinator, light, device, host, name):
+        super().__init__(coordinator)
         self._light = light
+        self._device = device
         self._host = host
         self._port = 8900
         self._name = name
@@ -150,7 +294,7 @@ class coloLight(Light, RestoreEntity):
         self._brightness = 255
         self._hs_color = None
         self._available = True
-        self._can_update = True
+        self._written_state = None
 
     @property
     def name(self):
@@ -180,10 +324,6 @@ class coloLight(Light, RestoreEntity):
     def is_on(self):
         return self._on
 
-    @property
-    def should_poll(self) -> bool:
-        return True
-
     @property
     def color_mode(self) -> ColorMode:
         if self._effect:
@@ -204,7 +344,8 @@ class coloLight(Light, RestoreEntity):
         return {
             "set_effect": self._effect,
             "set_hs_color": self._hs_color,
-            "set_brightness": self._brightness
+            "set_brightness": self._brightness,
+            "circuit_breaker": self._device.breaker_state,
         }
 
     @property
@@ -224,39 +365,56 @@ class coloLight(Light, RestoreEntity):
             "model": "Cololight",
         }
 
-    async def async_turn_on(self, **kwargs):
-        hs_color = kwargs.get(ATTR_HS_COLOR)
-        brightness = kwargs.get(ATTR_BRIGHTNESS)
-        effect = kwargs.get(ATTR_EFFECT)
+    def _turn_on_command(self, brightness, hs_color, effect):
+        if effect and effect not in self._effect_list:
+            raise HomeAssistantError(f"Cololight {self.name} has no effect '{effect}'")
 
+        # color_util is exact, a lookup table would save under a microsecond
+        # per command at the cost of accuracy and import time
         rgb = color_util.color_hs_to_RGB(*hs_color) if hs_color else None
 
-        if rgb:
+        coverted_brightness = max(1, (int((brightness or self._brightness) / 2.55)))
+
+        return CololightCommand(True, coverted_brightness, rgb, effect)
+
+    @callback
+    def _command_sent(self, on, brightness=None, hs_color=None, effect=None):
+        """Apply a command to the entity, once it has been sent."""
+        self._on = on
+
+        if hs_color:
             self._hs_color = hs_color
             self._effect = None
-            self._light.colour = rgb
 
         if effect:
             self._effect = effect
             self._hs_color = None
-            self._light.effect = effect
 
         if brightness:
             self._brightness = brightness
 
-        coverted_brightness = max(1, (int(self._brightness / 2.55)))
+        self.async_write_ha_state()
+        self.coordinator.async_confirm_device(self._host)
 
-        self._light.on = coverted_brightness
-        self._on = True
-        self._can_update = False  # disable next update because light is not switched state to on and will return off state
+    async def async_turn_on(self, **kwargs):
+        # A command that would not change the device is not sent, so there is
+        # nothing to write or confirm
+        brightness = kwargs.get(ATTR_BRIGHTNESS)
+        hs_color = kwargs.get(ATTR_HS_COLOR)
+        effect = kwargs.get(ATTR_EFFECT)
+        if await self._device.async_command(
+            self._turn_on_command(brightness, hs_color, effect)
+        ):
+            self._command_sent(True, brightness, hs_color, effect)
 
     async def async_turn_off(self, **kwargs):
-        self._light.on = 0
-        self._on = False
-        self._can_update = False  # disable next update because light is not switched state to off and will return on state
+        if await self._device.async_turn_off():
+            self._command_sent(False)
 
     async def async_added_to_hass(self):
         """Handle entity about to be added to hass event."""
+        self.async_on_remove(self.coordinator.async_add_device(self._device))
+        self.async_on_remove(self._async_track_entity())
         await super().async_added_to_hass()
         last_state = await self.async_get_last_state()
         if last_state:
@@ -267,26 +425,65 @@ class coloLight(Light, RestoreEntity):
             brightness = last_state.attributes.get("set_brightness")
             self._brightness = 255 if brightness is None else brightness
 
-    async def async_update(self):
-        if self._can_update:
-            # after setting the light on or off from home assistant. Home assistant will ask directly for a update, but the light has not switched state so the update function will recive the old state and that trows home assistant off. Now if you turn the light on or off. _can_update wil be set to False and the first update will be skipped
-            await self.hass.async_add_executor_job(self._update_state)
-        else:
-            self._can_update = True
-
-    def _update_state(self):
+    @callback
+    def async_update_options(self, entry):
+        """Apply changed entry options, without a reload."""
+        load_rate_limit(self._device, entry)
+        if not load_effects(self._light, entry):
+            return
+
+        self._device.refresh_effects()
+        self._effect_list = self._light.effects
+        if self.hass is not None:
+            self.async_write_ha_state()
+
+    @callback
+    def _async_track_entity(self):
+        """Make the entity a target of the apply service."""
+        entities = self.hass.data[DOMAIN][DATA_ENTITIES]
+        entity_id = self.entity_id
+        entities[entity_id] = self
+
+        @callback
+        def remove():
+            entities.pop(entity_id, None)
+
+        return remove
+
+    @callback
+    def _handle_coordinator_update(self):
+        if not self.coordinator.data or self._host not in self.coordinator.data:
+            return
+
+        if self._update_state(self.coordinator.data[self._host]):
+            self.async_write_ha_state()
+
+    def _polled_state(self):
+        return self._available, self._on, self._brightness, self._device.breaker_state
+
+    @callback
+    def async_write_ha_state(self):
+        self._written_state = self._polled_state()
+        super().async_write_ha_state()
+
+    def _update_state(self, state):
+        """Apply a polled state, returning whether it differs from the last written."""
         _LOGGER.debug("Updating cololight: %s", self._name)
-        try:
-            self._light.state
-            self._on = self._light.on
-            if self._on:
-                self._brightness = round(self._light.brightness * 2.55)
-
-            self._available = True
-
-        except UnavailableException:
+        if isinstance(state, UnavailableException):
             self._available = False
             _LOGGER.debug("Cololight unavailable: %s", self._name)
 
-        except:
+        elif isinstance(state, Exception):
             _LOGGER.error("Error with update status of Cololight: %s", self._name)
+
+        elif state is not None:
+            # State is optimistic after a command. Readings taken before the
+            # last command was sent are stale, later ones confirm or correct it.
+            if self._device.is_current(state):
+                self._on = state.on
+                if self._on:
+                    self._brightness = round(state.brightness * 2.55)
+
+            self._available = True
+
+        return self._polled_state() != self._written_state
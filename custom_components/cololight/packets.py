@@ -0,0 +1,78 @@
+"""
+Packet encoding for Cololight devices.
+
+Packets are encoded the same way as PyCololight. Each packet carries a counter
+that alternates between 1 and 2, so fixed packets are stored for both values.
+Brightness levels and the default/dynamic effects are encoded once at import,
+custom effects and colours the first time they are used.
+"""
+
+from functools import lru_cache
+
+from pycololight.constants import COMMAND_PREFIX, DEFAULT_EFFECTS, STRIP_DYANMIC_EFFECTS
+
+CONFIG_FORMATS = {
+    "command": COMMAND_PREFIX + "20{}4010301c",
+    "effect": COMMAND_PREFIX + "23{}4010602ff",
+    "state": COMMAND_PREFIX + "1e{}3020101",
+}
+
+
+def next_counter(counter):
+    return 2 if counter == 1 else 1
+
+
+def encode_packet(config_type, counter, body=""):
+    """Encode a single packet for the given counter value."""
+    count = f"000000000000000000000000000000000{counter}0000000000000000000"
+    return bytes.fromhex(CONFIG_FORMATS[config_type].format(count) + body)
+
+
+def _encode_both(config_type, body=""):
+    return (encode_packet(config_type, 1, body), encode_packet(config_type, 2, body))
+
+
+def _encode_effect(commands, counter):
+    packets = []
+    for command in commands:
+        packets.append(encode_packet("effect", counter, command))
+        counter = next_counter(counter)
+    return tuple(packets)
+
+
+# Indexed by [brightness][counter - 1]
+BRIGHTNESS_PACKETS = tuple(
+    _encode_both("command", f"f{brightness:02x}") for brightness in range(101)
+)
+OFF_PACKETS = _encode_both("command", "e1e")
+STATE_PACKETS = _encode_both("state")
+
+COLOUR_PACKET_CACHE_SIZE = 1024
+
+_EFFECT_PACKETS = {}
+
+
+@lru_cache(maxsize=COLOUR_PACKET_CACHE_SIZE)
+def colour_packet_table(colour):
+    """Return the packets for an RGB colour, indexed by counter - 1."""
+    return _encode_both("effect", "00{:02x}{:02x}{:02x}".format(*colour))
+
+
+def effect_packet_table(commands):
+    """
+    Return the packets for an effect, starting with counter 1 and counter 2.
+
+    Tables are shared by every device using the same effect commands.
+    """
+    key = tuple(commands)
+    table = _EFFECT_PACKETS.get(key)
+    if table is None:
+        table = _EFFECT_PACKETS[key] = (
+            _encode_effect(key, 1),
+            _encode_effect(key, 2),
+        )
+    return table
+
+
+for _commands in (*DEFAULT_EFFECTS.values(), *STRIP_DYANMIC_EFFECTS.values()):
+    effect_packet_table(_commands)
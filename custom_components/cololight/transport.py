@@ -0,0 +1,170 @@
+"""Asyncio UDP transport for Cololight devices."""
+import asyncio
+import ipaddress
+import logging
+import socket
+
+from pycololight import UnavailableException
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8900
+
+# Room for replies from a large fleet polled at the same moment
+RECEIVE_BUFFER_SIZE = 1024 * 1024
+
+
+class CololightProtocol(asyncio.DatagramProtocol):
+    """Datagram protocol routing replies to waiters by source address."""
+
+    def __init__(self):
+        self.transport = None
+        self._waiters = {}
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        waiters = self._waiters.pop(addr[0], None)
+        if not waiters:
+            _LOGGER.debug("Unexpected datagram from %s", addr)
+            return
+
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(data)
+
+    def error_received(self, exc):
+        _LOGGER.debug("Cololight transport error: %s", exc)
+
+    def connection_lost(self, exc):
+        self.transport = None
+        for waiters in self._waiters.values():
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_exception(UnavailableException())
+        self._waiters.clear()
+
+    def add_waiter(self, host):
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(host, []).append(waiter)
+        return waiter
+
+    def remove_waiter(self, host, waiter):
+        waiters = self._waiters.get(host)
+        if waiters and waiter in waiters:
+            waiters.remove(waiter)
+            if not waiters:
+                del self._waiters[host]
+
+
+class CololightTransport:
+    """
+    Single non-blocking UDP endpoint shared by all Cololight devices.
+
+    Replies are matched to requests by the address of the device they came from.
+    """
+
+    def __init__(self):
+        self._protocol = CololightProtocol()
+        self._lock = asyncio.Lock()
+
+    async def _async_get_transport(self):
+        async with self._lock:
+            if self._protocol.transport is None:
+                loop = asyncio.get_running_loop()
+                transport, _ = await loop.create_datagram_endpoint(
+                    lambda: self._protocol, local_addr=("0.0.0.0", 0)
+                )
+                try:
+                    transport.get_extra_info("socket").setsockopt(
+                        socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER_SIZE
+                    )
+                except OSError as exc:
+                    _LOGGER.debug("Unable to set receive buffer size: %s", exc)
+            return self._protocol.transport
+
+    async def async_resolve(self, host, port=DEFAULT_PORT):
+        """
+        Return the IPv4 address of a host, without blocking the event loop.
+
+        Raises UnavailableException when a hostname cannot be resolved.
+        """
+        try:
+            ipaddress.ip_address(host)
+            return host
+        except ValueError:
+            pass
+
+        try:
+            addresses = await asyncio.get_running_loop().getaddrinfo(
+                host, port, family=socket.AF_INET, type=socket.SOCK_DGRAM
+            )
+        except OSError as exc:
+            raise UnavailableException from exc
+        return addresses[0][4][0]
+
+    async def async_send(self, host, packets, port=DEFAULT_PORT):
+        """Send packets to a device, without waiting for a reply."""
+        transport = await self._async_get_transport()
+        # sendto would resolve a hostname synchronously
+        host = await self.async_resolve(host, port)
+        for packet in packets:
+            transport.sendto(packet, (host, port))
+
+    async def async_send_many(self, sends):
+        """
+        Send packets to several devices in one pass of the event loop.
+
+        Sends are (host, packets, port) tuples.
+        """
+        transport = await self._async_get_transport()
+        sends = [
+            (await self.async_resolve(host, port), packets, port)
+            for host, packets, port in sends
+        ]
+        for host, packets, port in sends:
+            for packet in packets:
+                transport.sendto(packet, (host, port))
+
+    async def async_request(
+        self, host, packet, timeout, port=DEFAULT_PORT, hedge_delay=None, on_send=None
+    ):
+        """
+        Send a packet to a device and wait for its reply.
+
+        With hedge_delay, the packet is sent again if no reply has arrived by
+        then, and whichever reply arrives first is used. on_send is called each
+        time the packet is sent.
+        """
+        transport = await self._async_get_transport()
+        # Replies are matched by source address, so hostnames are resolved first
+        host = await self.async_resolve(host, port)
+        waiter = self._protocol.add_waiter(host)
+        hedge = None
+        try:
+            transport.sendto(packet, (host, port))
+            if on_send is not None:
+                on_send()
+            if hedge_delay is not None and hedge_delay < timeout:
+                hedge = asyncio.get_running_loop().call_later(
+                    hedge_delay, self._hedge, waiter, packet, (host, port), on_send
+                )
+            return await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError as exc:
+            raise UnavailableException from exc
+        finally:
+            if hedge is not None:
+                hedge.cancel()
+            self._protocol.remove_waiter(host, waiter)
+
+    def _hedge(self, waiter, packet, addr, on_send):
+        if not waiter.done() and self._protocol.transport is not None:
+            self._protocol.transport.sendto(packet, addr)
+            if on_send is not None:
+                on_send()
+
+    def close(self):
+        """Close the underlying socket."""
+        if self._protocol.transport is not None:
+            self._protocol.transport.close()
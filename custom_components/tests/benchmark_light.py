@@ -0,0 +1,176 @@
+"""
+Latency and throughput benchmarks for the Cololight light platform.
+
+Drives emulated devices (see emulator.py) through Home Assistant, measuring
+config entry setup time, per-command latency, fan-out to every light in one
+service call, poll cycle duration and peak memory for each device count.
+Peak memory is the most allocated by Python while that count was running.
+
+Not collected by a plain `pytest` run, run explicitly with:
+
+    pytest custom_components/tests/benchmark_light.py
+
+Results are written as JSON to COLOLIGHT_BENCHMARK_OUTPUT (default
+benchmark.json). Device counts can be set with COLOLIGHT_BENCHMARK_DEVICES,
+eg. "1,10".
+"""
+import asyncio
+import json
+import os
+import statistics
+import time
+import tracemalloc
+
+import pytest
+
+from tests.conftest import hass, hass_storage, load_registries, hass_fixture_setup, mock_recorder_before_hass
+from tests.common import MockConfigEntry
+from homeassistant.const import ATTR_ENTITY_ID
+from homeassistant.components.light import (
+    ATTR_BRIGHTNESS,
+    DOMAIN as LIGHT_DOMAIN,
+    SERVICE_TURN_ON,
+)
+from homeassistant.setup import async_setup_component
+from homeassistant.util.dt import utcnow
+from homeassistant.components.cololight.device import (
+    POLL_GRACE_PERIOD,
+    CololightState,
+)
+
+from emulator import async_start_emulators
+
+DEVICE_COUNTS = [
+    int(count)
+    for count in os.getenv("COLOLIGHT_BENCHMARK_DEVICES", "1,10,100,1000").split(",")
+]
+OUTPUT = os.environ.get("COLOLIGHT_BENCHMARK_OUTPUT", "benchmark.json")
+EMULATOR_LATENCY = 0.005
+
+RESULTS = []
+
+
+async def async_wait_until(condition, timeout=5):
+    """Wait for the emulators to apply the packets sent to them."""
+    deadline = time.perf_counter() + timeout
+    while not condition() and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+
+
+def percentile(samples, percent):
+    samples = sorted(samples)
+    index = min(len(samples) - 1, round(percent / 100 * (len(samples) - 1)))
+    return samples[index]
+
+
+@pytest.fixture(scope="module", autouse=True)
+def write_results():
+    yield
+    with open(OUTPUT, "w", encoding="utf-8") as output:
+        json.dump(RESULTS, output, indent=2)
+
+
+async def async_run_scenario(hass, entries):
+    """Set up the entries, drive their lights and unload them again."""
+    device_count = len(entries)
+    start = time.perf_counter()
+    if "cololight" in hass.config.components:
+        await asyncio.gather(
+            *(hass.config_entries.async_setup(entry.entry_id) for entry in entries)
+        )
+    else:
+        await async_setup_component(hass, "cololight", {})
+    await hass.async_block_till_done()
+    setup_time = time.perf_counter() - start
+
+    entity_ids = [f"light.bench_{index}" for index in range(device_count)]
+    latencies = []
+    for entity_id in entity_ids:
+        start = time.perf_counter()
+        await hass.services.async_call(
+            LIGHT_DOMAIN,
+            SERVICE_TURN_ON,
+            {ATTR_ENTITY_ID: entity_id, ATTR_BRIGHTNESS: 128},
+            blocking=True,
+        )
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await hass.services.async_call(
+        LIGHT_DOMAIN,
+        SERVICE_TURN_ON,
+        {ATTR_ENTITY_ID: entity_ids, ATTR_BRIGHTNESS: 255},
+        blocking=True,
+    )
+    fan_out_time = time.perf_counter() - start
+
+    # Polls within the grace period of a command are skipped
+    await asyncio.sleep(POLL_GRACE_PERIOD)
+    coordinator = hass.data["cololight"]["coordinator"]
+    for host in coordinator._next_poll:
+        coordinator._next_poll[host] = utcnow()
+    start = time.perf_counter()
+    await coordinator.async_refresh()
+    poll_cycle_time = time.perf_counter() - start
+    polled = sum(
+        1 for state in coordinator.data.values() if isinstance(state, CololightState)
+    )
+
+    for entry in entries:
+        await hass.config_entries.async_unload(entry.entry_id)
+    await hass.async_block_till_done()
+
+    return {
+        "devices": device_count,
+        "setup_time": setup_time,
+        "command_latency_p50": statistics.median(latencies),
+        "command_latency_p99": percentile(latencies, 99),
+        "fan_out_time": fan_out_time,
+        "poll_cycle_time": poll_cycle_time,
+        "poll_replies": polled,
+    }
+
+
+@pytest.mark.parametrize("device_count", DEVICE_COUNTS)
+async def test_benchmark(hass, socket_enabled, device_count):
+    emulators = await async_start_emulators(device_count, latency=EMULATOR_LATENCY)
+
+    try:
+        entries = []
+        for index, emulator in enumerate(emulators):
+            entry = MockConfigEntry(
+                domain="cololight",
+                data={
+                    "name": f"bench_{index}",
+                    "host": emulator.host,
+                    "device": "hexagon",
+                    "default_effects": ["Sunrise", "Savasana"],
+                },
+                options={},
+            )
+            entry.add_to_hass(hass)
+            entries.append(entry)
+
+        result = await async_run_scenario(hass, entries)
+
+        # Memory is traced in a second, untimed run, as tracing slows every
+        # allocation. Only allocations made during this device count's run count.
+        tracemalloc.start()
+        try:
+            await async_run_scenario(hass, entries)
+            _, peak_memory = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        await async_wait_until(
+            lambda: all(
+                emulator.on and emulator.brightness == 100 for emulator in emulators
+            )
+        )
+    finally:
+        for emulator in emulators:
+            emulator.close()
+
+    RESULTS.append({**result, "peak_memory_kb": peak_memory // 1024})
+
+    assert all(emulator.on and emulator.brightness == 100 for emulator in emulators)
@@ -0,0 +1,170 @@
+"""
+Local emulator for the Cololight UDP protocol.
+
+Each emulated device listens on port 8900 of its own loopback address
+(127.0.0.2, 127.0.0.3, ...), applies brightness/off/colour/effect packets and
+replies to state queries the way a real device does. Latency, jitter and packet
+loss can be configured to exercise the integration's I/O paths without hardware.
+
+Linux routes all of 127.0.0.0/8 to the loopback interface. On macOS the extra
+addresses need adding first, eg. `sudo ifconfig lo0 alias 127.0.0.2 up`.
+
+Run standalone with:
+
+    python custom_components/tests/emulator.py --count 10 --latency 0.02
+"""
+import argparse
+import asyncio
+import random
+
+from pycololight.constants import (
+    COMMAND_PREFIX,
+    DEFAULT_EFFECTS,
+    STRIP_DYANMIC_EFFECTS,
+)
+
+PORT = 8900
+
+PACKET_COMMAND = "20"
+PACKET_EFFECT = "23"
+PACKET_STATE = "1e"
+
+# Effect commands each device personality does not understand
+PERSONALITIES = {
+    "hexagon": {
+        "unsupported_effects": {
+            command
+            for commands in STRIP_DYANMIC_EFFECTS.values()
+            for command in commands
+        }
+        - {command for commands in DEFAULT_EFFECTS.values() for command in commands}
+    },
+    "strip": {"unsupported_effects": set()},
+}
+
+
+def emulator_host(index):
+    """Loopback address of the emulated device with the given index."""
+    return f"127.0.{index // 250}.{index % 250 + 2}"
+
+
+class CololightEmulator(asyncio.DatagramProtocol):
+    """Emulated Cololight device."""
+
+    def __init__(self, device="hexagon", latency=0, jitter=0, loss=0, seed=None):
+        self.device = device
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.on = False
+        self.brightness = 0
+        self.colour = None
+        self.effect_commands = []
+        self.received = []
+        self.host = None
+        self._unsupported_effects = PERSONALITIES[device]["unsupported_effects"]
+        self._random = random.Random(seed)
+        self._transport = None
+
+    async def async_start(self, host="127.0.0.1", port=PORT):
+        loop = asyncio.get_running_loop()
+        await loop.create_datagram_endpoint(lambda: self, local_addr=(host, port))
+        self.host = host
+        return self
+
+    def close(self):
+        if self._transport is not None:
+            self._transport.close()
+
+    def connection_made(self, transport):
+        self._transport = transport
+
+    def connection_lost(self, exc):
+        self._transport = None
+
+    def datagram_received(self, data, addr):
+        if self._random.random() < self.loss:
+            return
+
+        delay = self.latency + self._random.uniform(0, self.jitter)
+        if delay:
+            asyncio.get_running_loop().call_later(delay, self._handle, data, addr)
+        else:
+            self._handle(data, addr)
+
+    def _handle(self, data, addr):
+        self.received.append(data)
+        packet = data.hex()
+        if not packet.startswith(COMMAND_PREFIX):
+            return
+
+        packet_type = packet[len(COMMAND_PREFIX) : len(COMMAND_PREFIX) + 2]
+        if packet_type == PACKET_STATE and self._transport is not None:
+            self._transport.sendto(self.state_reply(), addr)
+        elif packet_type == PACKET_COMMAND:
+            self._handle_command(packet[-3:])
+        elif packet_type == PACKET_EFFECT:
+            self._handle_effect(packet[-8:])
+
+    def _handle_command(self, body):
+        if body == "e1e":
+            self.on = False
+        elif body.startswith("f"):
+            self.on = True
+            self.brightness = int(body[1:], 16)
+
+    def _handle_effect(self, body):
+        if body.startswith("00"):
+            self.colour = tuple(bytes.fromhex(body[2:]))
+            self.effect_commands = []
+        elif body not in self._unsupported_effects:
+            self.colour = None
+            self.effect_commands.append(body)
+
+    def state_reply(self):
+        reply = bytearray(bytes.fromhex(COMMAND_PREFIX).ljust(40, b"\x00"))
+        if self.on:
+            reply.extend([207, self.brightness])
+        else:
+            reply.extend([206, 0])
+        return bytes(reply)
+
+
+async def async_start_emulators(count, device="hexagon", **kwargs):
+    """Start a number of emulated devices on consecutive loopback addresses."""
+    return [
+        await CololightEmulator(device, **kwargs).async_start(emulator_host(index))
+        for index in range(count)
+    ]
+
+
+async def main(args):
+    emulators = await async_start_emulators(
+        args.count,
+        args.device,
+        latency=args.latency,
+        jitter=args.jitter,
+        loss=args.loss,
+    )
+    print(f"Emulating {args.count} {args.device} devices:")
+    for emulator in emulators:
+        print(f"  {emulator.host}:{PORT}")
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        for emulator in emulators:
+            emulator.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Emulate Cololight devices")
+    parser.add_argument("--count", type=int, default=1)
+    parser.add_argument("--device", choices=list(PERSONALITIES), default="hexagon")
+    parser.add_argument("--latency", type=float, default=0)
+    parser.add_argument("--jitter", type=float, default=0)
+    parser.add_argument("--loss", type=float, default=0)
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
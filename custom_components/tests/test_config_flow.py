@@ -35,6 +35,24 @@ DEMO_USER_INPUT_2 = {
 }
 
 
+@pytest.fixture(autouse=True)
+def discovered_hosts():
+    with patch(
+        "homeassistant.components.cololight.config_flow.async_discover",
+        return_value=[],
+    ) as mock_discover:
+        yield mock_discover
+
+
+@pytest.fixture(autouse=True)
+def probe():
+    with patch(
+        "homeassistant.components.cololight.config_flow.async_probe",
+        return_value=True,
+    ) as mock_probe:
+        yield mock_probe
+
+
 @pytest.fixture
 def demo_user_input():
     return deepcopy(DEMO_USER_INPUT)
@@ -132,6 +150,84 @@ async def test_form_already_configured(hass, demo_user_input):
     assert result["reason"] == "already_configured"
 
 
+async def test_form_cannot_connect(hass, probe, demo_user_input):
+    """Test an unreachable host shows an error and keeps the entered values."""
+    probe.return_value = False
+
+    result = await hass.config_entries.flow.async_init(
+        cololight.DOMAIN, context={"source": "user"}
+    )
+    result = await hass.config_entries.flow.async_configure(
+        result["flow_id"], user_input=demo_user_input["device_data"]
+    )
+
+    assert result["type"] == FlowResultType.FORM
+    assert result["step_id"] == "user"
+    assert result["errors"] == {"base": "cannot_connect"}
+    assert result["data_schema"]({}) == demo_user_input["device_data"]
+    probe.assert_called_once_with(HOST)
+
+
+async def test_form_discovered_devices(hass, discovered_hosts):
+    """Test discovered devices are offered, and each selected one gets a flow."""
+    discovered_hosts.return_value = [HOST, "1.1.1.2", "1.1.1.3"]
+
+    result = await hass.config_entries.flow.async_init(
+        cololight.DOMAIN, context={"source": "user"}
+    )
+    assert result["type"] == FlowResultType.FORM
+    assert result["step_id"] == "pick_devices"
+
+    result = await hass.config_entries.flow.async_configure(
+        result["flow_id"], user_input={"hosts": [HOST, "1.1.1.3"]}
+    )
+    await hass.async_block_till_done()
+
+    assert result["type"] == FlowResultType.FORM
+    assert result["step_id"] == "user"
+    assert result["data_schema"]({"name": NAME})["host"] == HOST
+
+    flows = hass.config_entries.flow.async_progress()
+    discovered = [flow for flow in flows if flow["flow_id"] != result["flow_id"]]
+    assert len(discovered) == 1
+    assert discovered[0]["context"]["unique_id"] == "1.1.1.3"
+    assert discovered[0]["step_id"] == "user"
+
+
+async def test_form_discovery_skips_configured_hosts(
+    hass, discovered_hosts, demo_user_input
+):
+    """Test hosts already set up are not offered."""
+    entry = MockConfigEntry(
+        domain=cololight.DOMAIN, data=demo_user_input["device_data"], unique_id=HOST
+    )
+    entry.add_to_hass(hass)
+    discovered_hosts.return_value = [HOST]
+
+    result = await hass.config_entries.flow.async_init(
+        cololight.DOMAIN, context={"source": "user"}
+    )
+
+    assert result["type"] == FlowResultType.FORM
+    assert result["step_id"] == "user"
+
+
+async def test_form_no_devices_picked(hass, discovered_hosts):
+    """Test picking no devices falls back to entering a host."""
+    discovered_hosts.return_value = [HOST]
+
+    result = await hass.config_entries.flow.async_init(
+        cololight.DOMAIN, context={"source": "user"}
+    )
+    result = await hass.config_entries.flow.async_configure(
+        result["flow_id"], user_input={"hosts": []}
+    )
+
+    assert result["type"] == FlowResultType.FORM
+    assert result["step_id"] == "user"
+    assert len(hass.config_entries.flow.async_progress()) == 1
+
+
 @patch(
     "homeassistant.components.cololight.config_flow.CololightOptionsFlowHandler._get_color_schemes",
     return_value=["Mood | Green", "Mood | Red"],
@@ -181,6 +277,7 @@ async def test_options_creating_effect(
             "color": "Green",
             "cycle_speed": 1,
             "mode": 1,
+            "commands": ["01b62000"],
         }
     }
 
@@ -206,12 +303,14 @@ async def test_options_creating_effect(
             "color": "Green",
             "cycle_speed": 1,
             "mode": 1,
+            "commands": ["01b62000"],
         },
         "test_2": {
             "color_scheme": "Mood",
             "color": "Green",
             "cycle_speed": 1,
             "mode": 1,
+            "commands": ["01b62000"],
         },
     }
 
@@ -255,6 +354,7 @@ async def test_options_updating_effect(
             "color": "Green",
             "cycle_speed": 1,
             "mode": 1,
+            "commands": ["01b62000"],
         }
     }
 
@@ -279,10 +379,42 @@ async def test_options_updating_effect(
             "color": "Red",
             "cycle_speed": 1,
             "mode": 1,
+            "commands": ["01b32000"],
         }
     }
 
 
+@patch(
+    "homeassistant.components.cololight.config_flow.CololightOptionsFlowHandler._get_cololight"
+)
+async def test_options_rate_limit(mock_cololight, hass, demo_user_input):
+    """Test options for the command rate"""
+    entry = MockConfigEntry(
+        domain=cololight.DOMAIN, data=demo_user_input, unique_id=HOST
+    )
+    entry.add_to_hass(hass)
+
+    result = await hass.config_entries.options.async_init(entry.entry_id)
+    result = await hass.config_entries.options.async_configure(
+        result["flow_id"], user_input={"next_step_id": "rate_limit"}
+    )
+
+    assert result["type"] == FlowResultType.FORM
+    assert result["step_id"] == "rate_limit"
+
+    result = await hass.config_entries.options.async_configure(
+        result["flow_id"],
+        user_input={"command_interval": 0.2, "rate_limit": 5, "rate_burst": 4},
+    )
+
+    assert result["type"] == FlowResultType.CREATE_ENTRY
+    assert result["data"] == {
+        "command_interval": 0.2,
+        "rate_limit": 5.0,
+        "rate_burst": 4,
+    }
+
+
 @patch(
     "homeassistant.components.cololight.config_flow.CololightOptionsFlowHandler._get_effects",
     return_value={
@@ -639,3 +771,32 @@ async def test_end_to_end_with_options(hass, demo_user_input):
         "Savasana",
         "Unicorns",
     ]
+
+
+async def test_migrate_entry_encodes_custom_effects(hass, demo_user_input):
+    """Test version 1 entries gain the encoded commands of custom effects."""
+    entry = MockConfigEntry(
+        domain=cololight.DOMAIN,
+        data=demo_user_input["device_data"] | demo_user_input["effects_data"],
+        unique_id=HOST,
+        version=1,
+        options={
+            "test": {"color_scheme": "Mood", "color": "Green", "cycle_speed": 1, "mode": 1},
+            "bad": {"color_scheme": "Bad", "color": "Green", "cycle_speed": 1, "mode": 1},
+            "removed_effects": ["Cherry Blossom"],
+        },
+    )
+    entry.add_to_hass(hass)
+
+    await hass.config_entries.async_setup(entry.entry_id)
+    await hass.async_block_till_done()
+
+    assert entry.version == 2
+    assert entry.options["test"]["commands"] == ["01b62000"]
+    assert "commands" not in entry.options["bad"]
+    assert entry.options["removed_effects"] == ["Cherry Blossom"]
+    assert hass.data["cololight"][entry.entry_id].effects == [
+        "80s Club",
+        "Cherry Blossom",
+        "test",
+    ]
@@ -0,0 +1,100 @@
+import pytest
+from datetime import timedelta
+
+from unittest.mock import AsyncMock, MagicMock
+from pycololight import UnavailableException
+
+from tests.conftest import hass, hass_storage, load_registries, hass_fixture_setup, mock_recorder_before_hass
+from tests.common import async_fire_time_changed
+
+from homeassistant.components.cololight.coordinator import (
+    CololightCoordinator,
+    MAX_SCAN_INTERVAL,
+    SCAN_INTERVAL,
+)
+from homeassistant.components.cololight.device import CololightState
+from homeassistant.util.dt import utcnow
+
+
+@pytest.fixture
+async def coordinator(hass):
+    """Create a coordinator, shut down after the test."""
+    coordinator = CololightCoordinator(hass)
+    yield coordinator
+    await coordinator.async_shutdown()
+
+
+def mock_device(host, state):
+    device = MagicMock(host=host)
+    device.async_get_state = AsyncMock(side_effect=state)
+    return device
+
+
+async def test_stable_device_backs_off(coordinator):
+    """Test the poll interval grows while the state does not change."""
+    coordinator.async_add_device(
+        mock_device("1.1.1.1", lambda: CololightState(True, 50, 0))
+    )
+
+    await coordinator._async_update_data()
+    assert coordinator._intervals["1.1.1.1"] == SCAN_INTERVAL
+
+    coordinator._next_poll["1.1.1.1"] -= SCAN_INTERVAL
+    await coordinator._async_update_data()
+    assert coordinator._intervals["1.1.1.1"] == SCAN_INTERVAL * 1.5
+
+
+async def test_unavailable_device_backs_off_exponentially(coordinator):
+    """Test unavailable devices are polled less often, up to a limit."""
+    coordinator.async_add_device(mock_device("1.1.1.1", UnavailableException))
+
+    intervals = []
+    for _ in range(6):
+        coordinator._next_poll["1.1.1.1"] -= MAX_SCAN_INTERVAL
+        await coordinator._async_update_data()
+        intervals.append(coordinator._intervals["1.1.1.1"])
+
+    assert SCAN_INTERVAL <= intervals[0] <= SCAN_INTERVAL * 2
+    assert SCAN_INTERVAL * 2 <= intervals[1] <= SCAN_INTERVAL * 4
+    assert all(interval <= MAX_SCAN_INTERVAL for interval in intervals)
+
+
+async def test_only_due_devices_are_polled(coordinator):
+    """Test a pass only queries devices whose poll is due."""
+    device_1 = mock_device("1.1.1.1", lambda: CololightState(False, None, 0))
+    device_2 = mock_device("1.1.1.2", lambda: CololightState(False, None, 0))
+    coordinator.async_add_device(device_1)
+    coordinator.async_add_device(device_2)
+
+    await coordinator._async_update_data()
+    coordinator._next_poll["1.1.1.2"] -= timedelta(minutes=1)
+    data = await coordinator._async_update_data()
+
+    assert list(data) == ["1.1.1.2"]
+    assert device_1.async_get_state.call_count == 1
+    assert device_2.async_get_state.call_count == 2
+
+
+async def test_skipped_query_keeps_backoff(coordinator):
+    """Test a query skipped for a command does not reset an unavailable backoff."""
+    states = [UnavailableException, UnavailableException, None]
+    coordinator.async_add_device(mock_device("1.1.1.1", states))
+
+    for _ in range(3):
+        coordinator._next_poll["1.1.1.1"] -= MAX_SCAN_INTERVAL
+        await coordinator._async_update_data()
+
+    assert coordinator._failures["1.1.1.1"] == 2
+    assert coordinator._intervals["1.1.1.1"] >= SCAN_INTERVAL * 2
+
+
+async def test_added_device_is_polled_soon(hass, coordinator):
+    """Test a device added while polling is backed off is polled promptly."""
+    coordinator.update_interval = MAX_SCAN_INTERVAL
+    device = mock_device("1.1.1.1", lambda: CololightState(False, None, 0))
+
+    coordinator.async_add_device(device)
+    async_fire_time_changed(hass, utcnow() + timedelta(seconds=2))
+    await hass.async_block_till_done()
+
+    assert device.async_get_state.call_count == 1
@@ -0,0 +1,367 @@
+import asyncio
+import pytest
+
+from unittest.mock import AsyncMock, MagicMock, patch
+from pycololight import PyCololight, UnavailableException
+
+from homeassistant.components.cololight.device import (
+    CololightCommand,
+    CololightDevice,
+    async_command_all,
+)
+
+HOST = "1.1.1.1"
+
+
+@pytest.fixture
+def transport():
+    """Transport with mocked network calls."""
+    cololight_transport = MagicMock()
+    cololight_transport.async_resolve = AsyncMock(side_effect=lambda host, port: host)
+    cololight_transport.async_send = AsyncMock()
+    cololight_transport.async_send_many = AsyncMock()
+    cololight_transport.async_request = AsyncMock(
+        return_value=bytes(40) + bytes([207, 50])
+    )
+    return cololight_transport
+
+
+@pytest.fixture
+def device(transport):
+    light = PyCololight(device="hexagon", host=HOST, default_effects=True)
+    return CololightDevice(light, HOST, transport)
+
+
+async def test_breaker_opens_after_failures(device, transport):
+    """Test queries stop reaching the network once the breaker opens."""
+    transport.async_request.side_effect = UnavailableException
+
+    for _ in range(3):
+        with pytest.raises(UnavailableException):
+            await device.async_get_state()
+
+    assert device.breaker_state == "open"
+
+    with pytest.raises(UnavailableException):
+        await device.async_get_state()
+
+    assert transport.async_request.call_count == 3 * device.attempts
+
+
+async def test_breaker_probe_closes_breaker(device, transport):
+    """Test a successful half-open probe closes the breaker."""
+    transport.async_request.side_effect = UnavailableException
+
+    for _ in range(3):
+        with pytest.raises(UnavailableException):
+            await device.async_get_state()
+
+    transport.async_request.side_effect = None
+    with patch("homeassistant.components.cololight.device.BREAKER_RESET_TIMEOUT", 0):
+        state = await device.async_get_state()
+
+    assert state.on
+    assert device.breaker_state == "closed"
+    assert transport.async_request.call_args.args[2] == 1
+
+
+@pytest.mark.parametrize("effect", ["Sunrise", "Graffiti", "Tron"])
+async def test_cached_packets_match_pycololight(transport, effect):
+    """Test cached packets are the same as those PyCololight would send."""
+    light = PyCololight(device="strip", host=HOST, dynamic_effects=True)
+    device = CololightDevice(light, HOST, transport)
+
+    with patch.object(PyCololight, "_send") as mock_send:
+        light.effect = effect
+        light.brightness = 42
+        light.on = 0
+    expected = [packet for call in mock_send.call_args_list for packet in call.args[0]]
+
+    packets = [
+        *device.effect_packets(effect),
+        device.brightness_packet(42),
+        device.off_packet(),
+    ]
+
+    assert packets == expected
+
+
+async def test_hostname_resolved_once(transport):
+    """Test a device's hostname is resolved once, not on every send."""
+    transport.async_resolve = AsyncMock(return_value="1.1.1.9")
+    light = PyCololight(device="hexagon", host="cololight.local")
+    device = CololightDevice(light, "cololight.local", transport, poll_grace=0)
+
+    await device.async_turn_on(50)
+    await device.async_turn_off()
+    await device.async_get_state()
+
+    assert transport.async_resolve.call_count == 1
+    assert transport.async_send.call_args.args[0] == "1.1.1.9"
+    assert transport.async_request.call_args.args[0] == "1.1.1.9"
+
+
+async def test_query_retries_lost_reply(device, transport):
+    """Test a single lost reply does not make the device unavailable."""
+    transport.async_request.side_effect = [
+        UnavailableException,
+        bytes(40) + bytes([207, 50]),
+    ]
+
+    state = await device.async_get_state()
+
+    assert state.on
+    assert transport.async_request.call_count == 2
+    assert device.breaker_state == "closed"
+
+
+async def test_failed_send_keeps_readings_current(device, transport):
+    """Test readings are used again after a command fails to send."""
+    device.poll_grace = 0
+    transport.async_send.side_effect = OSError
+
+    with pytest.raises(OSError):
+        await device.async_turn_on(50)
+
+    assert device.is_current(await device.async_get_state())
+
+
+async def test_command_all_takes_over_pending_command(device, transport):
+    """Test a fan-out merges and completes a command waiting for its interval."""
+    loop = asyncio.get_running_loop()
+    device._last_sent = start = loop.time()
+    pending = asyncio.create_task(device.async_turn_on(50, colour=(255, 0, 0)))
+    await asyncio.sleep(0)
+
+    await async_command_all(transport, {device: CololightCommand(True, 20)})
+    await pending
+    await device._worker
+
+    assert loop.time() - start < device.command_interval
+
+    sends = transport.async_send_many.call_args.args[0]
+    assert len(sends) == 1
+    host, packets, _ = sends[0]
+    assert host == HOST
+    assert packets[0].hex().endswith("00ff0000")
+    assert packets[1].hex().endswith("f14")
+    assert transport.async_send.call_count == 0
+    assert device.sent_sequence == device.command_sequence
+
+
+async def test_command_all_goes_through_device_queue(device, transport):
+    """Test a fan-out waits for a send in progress and precedes later commands."""
+    device.command_interval = 0
+    calls = []
+
+    async def send(host, packets, port):
+        await asyncio.sleep(0.01)
+        calls.append(("send", packets[-1].hex()[-3:]))
+
+    async def send_many(sends):
+        calls.append(("send_many", sends[0][1][-1].hex()[-3:]))
+
+    transport.async_send.side_effect = send
+    transport.async_send_many.side_effect = send_many
+
+    first = asyncio.create_task(device.async_turn_on(10))
+    await asyncio.sleep(0.005)
+    fan_out = asyncio.create_task(
+        async_command_all(transport, {device: CololightCommand(True, 20)})
+    )
+    await asyncio.sleep(0)
+    later = asyncio.create_task(device.async_turn_on(30))
+    await asyncio.gather(first, fan_out, later)
+
+    assert calls == [("send", "f0a"), ("send_many", "f14"), ("send", "f1e")]
+    assert device.sent_sequence == device.command_sequence
+
+
+async def test_cancelled_command_all_settles_claimed_commands(device, transport):
+    """Test cancelling a fan-out cancels the commands it took over."""
+    device._last_sent = asyncio.get_running_loop().time()
+
+    async def send_many(sends):
+        await asyncio.Event().wait()
+
+    transport.async_send_many.side_effect = send_many
+
+    pending = asyncio.create_task(device.async_turn_on(50))
+    await asyncio.sleep(0)
+    fan_out = asyncio.create_task(
+        async_command_all(transport, {device: CololightCommand(True, 20)})
+    )
+    await asyncio.sleep(0.01)
+    fan_out.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        await asyncio.wait_for(pending, 1)
+    with pytest.raises(asyncio.CancelledError):
+        await fan_out
+    await device._worker
+
+    assert device.sent_sequence == device.command_sequence
+
+
+async def test_commands_and_queries_run_in_order(device, transport):
+    """Test a query made after a command reaches the device after it."""
+    device.poll_grace = 0
+    calls = []
+    transport.async_send.side_effect = lambda *args: calls.append("send")
+
+    async def request(*args):
+        calls.append("request")
+        return bytes(40) + bytes([207, 50])
+
+    transport.async_request.side_effect = request
+
+    command = asyncio.create_task(device.async_turn_on(50))
+    query = asyncio.create_task(device.async_get_state())
+    await asyncio.gather(command, query)
+
+    assert calls == ["send", "request"]
+    assert device.is_current(query.result())
+
+
+async def test_command_preempts_query(device, transport):
+    """Test a command cancels a query waiting on a slow reply."""
+
+    async def request(*args):
+        await asyncio.sleep(10)
+
+    transport.async_request.side_effect = request
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+
+    query = asyncio.create_task(device.async_get_state())
+    await asyncio.sleep(0.01)
+    await device.async_turn_on(50)
+
+    assert await query is None
+    assert loop.time() - start < 0.5
+    assert transport.async_send.call_count == 1
+    assert device.breaker_state == "closed"
+
+
+async def test_query_skipped_just_after_command(device, transport):
+    """Test a poll landing in the grace period after a command is skipped."""
+
+    await device.async_turn_on(50)
+
+    assert await device.async_get_state() is None
+    assert transport.async_request.call_count == 0
+
+
+async def test_rate_limit_merges_excess_commands(transport):
+    """Test commands beyond the rate limit are deferred and merged."""
+    light = PyCololight(device="hexagon", host=HOST)
+    device = CololightDevice(
+        light, HOST, transport, command_interval=0, rate_limit=(10, 2)
+    )
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+
+    await device.async_turn_on(10)
+    await device.async_turn_on(20)
+    await asyncio.gather(*(device.async_turn_on(level) for level in range(30, 60)))
+
+    packets = [call.args[1][0] for call in transport.async_send.call_args_list]
+    assert [packet.hex()[-3:] for packet in packets] == ["f0a", "f14", "f3b"]
+    assert loop.time() - start >= 0.09
+
+
+async def test_queries_count_against_rate_limit(transport):
+    """Test state queries and their duplicates are charged to the rate limit."""
+    light = PyCololight(device="hexagon", host=HOST)
+    device = CololightDevice(light, HOST, transport, rate_limit=(10, 1))
+    loop = asyncio.get_running_loop()
+
+    async def request(host, packet, timeout, port, hedge_delay, on_send):
+        # The query and its hedged duplicate
+        on_send()
+        on_send()
+        return bytes(40) + bytes([207, 50])
+
+    transport.async_request.side_effect = request
+    start = loop.time()
+
+    await device.async_get_state()
+    await device.async_get_state()
+
+    assert loop.time() - start >= 0.19
+
+
+def test_rate_limit_defaults_by_device_type(transport):
+    """Test strips allow bursts big enough for their dynamic effects."""
+    hexagon = CololightDevice(PyCololight(device="hexagon", host=HOST), HOST, transport)
+    strip = CololightDevice(PyCololight(device="strip", host=HOST), HOST, transport)
+
+    assert hexagon.rate_limit.burst >= 2
+    assert strip.rate_limit.burst >= 9
+
+
+async def test_redundant_command_suppressed(device, transport):
+    """Test a command matching the confirmed state is not sent."""
+    device.poll_grace = 0
+
+    assert await device.async_turn_on(50, colour=(255, 0, 0))
+    await device.async_get_state()
+    assert not await device.async_turn_on(50)
+    assert not await device.async_turn_on(50, colour=(255, 0, 0))
+
+    assert transport.async_send.call_count == 1
+    assert device.suppressed_commands == 2
+
+    await device.async_turn_on(50, colour=(0, 255, 0))
+
+    assert transport.async_send.call_count == 2
+
+
+async def test_command_sent_when_device_changed(device, transport):
+    """Test a reading that differs from the last command stops suppression."""
+    device.poll_grace = 0
+    transport.async_request.return_value = bytes(40) + bytes([207, 30])
+
+    await device.async_turn_on(50, effect="Sunrise")
+    await device.async_get_state()
+    await device.async_turn_on(30)
+    await device.async_turn_on(50, effect="Sunrise")
+
+    assert transport.async_send.call_count == 2
+    assert device.suppressed_commands == 1
+
+
+async def test_turn_off_suppressed_when_reported_off(device, transport):
+    """Test turning off a device a poll reported off sends nothing."""
+    transport.async_request.return_value = bytes(40) + bytes([206, 0])
+
+    await device.async_get_state()
+    await device.async_turn_off()
+
+    assert transport.async_send.call_count == 0
+    assert device.suppressed_commands == 1
+
+
+async def test_stale_confirmation_does_not_suppress(device, transport):
+    """Test a reading older than CONFIRMED_MAX_AGE no longer suppresses commands."""
+    transport.async_request.return_value = bytes(40) + bytes([206, 0])
+
+    await device.async_get_state()
+    with patch("homeassistant.components.cololight.device.CONFIRMED_MAX_AGE", 0):
+        assert await device.async_turn_off()
+
+    assert transport.async_send.call_count == 1
+    assert device.suppressed_commands == 0
+
+
+async def test_failed_query_clears_confirmation(device, transport):
+    """Test a device that stops replying is no longer assumed in its last state."""
+    transport.async_request.return_value = bytes(40) + bytes([206, 0])
+    await device.async_get_state()
+
+    transport.async_request.side_effect = UnavailableException
+    with pytest.raises(UnavailableException):
+        await device.async_get_state()
+
+    assert await device.async_turn_off()
+    assert transport.async_send.call_count == 1
@@ -0,0 +1,50 @@
+from datetime import timedelta
+
+from unittest.mock import patch
+
+from tests.conftest import hass, hass_storage, load_registries, hass_fixture_setup, mock_recorder_before_hass
+from tests.common import MockConfigEntry, async_fire_time_changed
+from homeassistant.const import ATTR_ENTITY_ID
+from homeassistant.components.light import DOMAIN as LIGHT_DOMAIN, SERVICE_TURN_OFF
+from homeassistant.util.dt import utcnow
+from homeassistant.components.cololight.diagnostics import (
+    async_get_config_entry_diagnostics,
+)
+
+ENTITY_LIGHT = "light.cololight_test"
+
+
+@patch("homeassistant.components.cololight.transport.CololightTransport.async_send")
+@patch(
+    "homeassistant.components.cololight.transport.CololightTransport.async_request",
+    return_value=bytes(40) + bytes([206, 0]),
+)
+async def test_diagnostics_count_suppressed_commands(mock_request, mock_send, hass):
+    """Test diagnostics report commands skipped for matching the polled state."""
+    entry = MockConfigEntry(
+        domain="cololight",
+        data={
+            "platform": "cololight",
+            "name": "cololight_test",
+            "host": "1.1.1.1",
+            "device": "hexagon",
+            "default_effects": [],
+        },
+        options={},
+    )
+    entry.add_to_hass(hass)
+    await hass.config_entries.async_setup(entry.entry_id)
+    await hass.async_block_till_done()
+
+    async_fire_time_changed(hass, utcnow() + timedelta(seconds=2))
+    await hass.async_block_till_done()
+    await hass.services.async_call(
+        LIGHT_DOMAIN, SERVICE_TURN_OFF, {ATTR_ENTITY_ID: ENTITY_LIGHT}, blocking=True
+    )
+
+    diagnostics = await async_get_config_entry_diagnostics(hass, entry)
+
+    assert mock_send.call_count == 0
+    assert diagnostics["data"]["host"] == "1.1.1.1"
+    assert diagnostics["device"]["suppressed_commands"] == 1
+    assert diagnostics["device"]["breaker_state"] == "closed"
@@ -0,0 +1,43 @@
+import ipaddress
+import time
+
+from cololight.discovery import async_discover_hosts, async_probe
+from emulator import async_start_emulators, emulator_host
+
+
+async def test_discover_emulated_devices(socket_enabled):
+    """Test devices replying to the sweep are found, in address order."""
+    emulators = await async_start_emulators(3, latency=0.01)
+
+    try:
+        hosts = await async_discover_hosts(
+            [ipaddress.ip_network("127.0.0.0/24")], timeout=0.2
+        )
+    finally:
+        for emulator in emulators:
+            emulator.close()
+
+    assert hosts == ["127.0.0.2", "127.0.0.3", "127.0.0.4"]
+
+
+async def test_discover_sweeps_subnet_quickly(socket_enabled):
+    """Test a /24 with no devices is swept in about the reply timeout."""
+
+    start = time.perf_counter()
+    hosts = await async_discover_hosts(
+        [ipaddress.ip_network("127.0.1.0/24")], timeout=0.2
+    )
+
+    assert hosts == []
+    assert time.perf_counter() - start < 1
+
+
+async def test_probe_emulated_device(socket_enabled):
+    """Test a probe succeeds against a device and fails where there is none."""
+    emulators = await async_start_emulators(1)
+
+    try:
+        assert await async_probe(emulators[0].host, timeout=0.2)
+        assert not await async_probe(emulator_host(1), timeout=0.2)
+    finally:
+        emulators[0].close()
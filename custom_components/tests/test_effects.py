@@ -0,0 +1,32 @@
+import pytest
+
+from pycololight import PyCololight
+
+from cololight.effects import colour_scheme_catalogue, colour_scheme_labels
+
+
+@pytest.mark.parametrize("device", ["hexagon", "strip"])
+def test_colour_scheme_catalogue(device):
+    """Test the catalogue matches the colours PyCololight offers, in order."""
+    light = PyCololight(device=device, host=None)
+    expected = [
+        (colour_scheme, colour)
+        for colour_scheme in light.custom_effect_colour_schemes()
+        for colour in light.custom_effect_colour_scheme_colours(colour_scheme)
+    ]
+
+    catalogue = colour_scheme_catalogue(device)
+
+    assert list(catalogue.values()) == expected
+    assert catalogue["Mood | Green"] == ("Mood", "Green")
+    assert colour_scheme_labels(device) == tuple(catalogue)
+
+
+def test_colour_scheme_catalogue_is_shared_and_read_only():
+    """Test the catalogue is built once and cannot be changed."""
+    catalogue = colour_scheme_catalogue("hexagon")
+
+    assert colour_scheme_catalogue("hexagon") is catalogue
+    assert colour_scheme_labels("hexagon") is colour_scheme_labels("hexagon")
+    with pytest.raises(TypeError):
+        catalogue["New | Colour"] = ("New", "Colour")
@@ -2,7 +2,7 @@ import pytest
 from datetime import timedelta
 
 from unittest.mock import patch
-from pycololight import UnavailableException
+from pycololight import DefaultEffectExecption, UnavailableException
 
 from tests.conftest import hass, hass_storage, load_registries, hass_fixture_setup, mock_recorder_before_hass
 from tests.common import MockConfigEntry, async_fire_time_changed
@@ -16,7 +16,11 @@ from homeassistant.components.light import (
     SERVICE_TURN_OFF,
     SERVICE_TURN_ON,
 )
+from homeassistant.exceptions import HomeAssistantError
 from homeassistant.util.dt import utcnow
+from homeassistant.components.cololight.device import CololightState
+from homeassistant.components.cololight.effects import custom_effect_commands
+from homeassistant.components.cololight.light import load_effects
 
 LIGHT_1_NAME = "cololight_test"
 ENTITY_1_LIGHT = f"light.{LIGHT_1_NAME}"
@@ -151,7 +155,7 @@ async def setup_comp(hass):
     return
 
 
-@patch("homeassistant.components.cololight.light.PyCololight._send")
+@patch("homeassistant.components.cololight.transport.CololightTransport.async_send")
 async def test_turn_on(mock_send, hass):
     """Test the light turns of successfully."""
 
@@ -169,7 +173,7 @@ async def test_turn_on(mock_send, hass):
     assert state.attributes.get(ATTR_BRIGHTNESS) == 255
 
 
-@patch("homeassistant.components.cololight.light.PyCololight._send")
+@patch("homeassistant.components.cololight.transport.CololightTransport.async_send")
 async def test_turn_on_with_brightness(mock_send, hass):
     """Test the light turns on to the specified brightness."""
 
@@ -187,7 +191,7 @@ async def test_turn_on_with_brightness(mock_send, hass):
     assert state.attributes.get(ATTR_BRIGHTNESS) == 60
 
 
-@patch("homeassistant.components.cololight.light.PyCololight._send")
+@patch("homeassistant.components.cololight.transport.CololightTransport.async_send")
 async def test_turn_on_with_effect(mock_send, hass):
     """Test the light turns on with effect."""
 
@@ -199,6 +203,10 @@ async def test_turn_on_with_effect(mock_send, hass):
     )
 
     state = hass.states.get(ENTITY_1_LIGHT)
+    packets = mock_send.call_args.args[1]
+
+    assert mock_send.call_count == 1
+    assert packets[-1].hex().endswith("4010301cf17")
 
     assert state.state == STATE_ON
     assert state.attributes.get("color_mode") == "brightness"
@@ -206,7 +214,28 @@ async def test_turn_on_with_effect(mock_send, hass):
     assert state.attributes.get(ATTR_EFFECT) == "Sunrise"
 
 
-@patch("homeassistant.components.cololight.light.PyCololight._send")
+@patch("homeassistant.components.cololight.transport.CololightTransport.async_send")
+async def test_turn_on_with_unknown_effect(mock_send, hass):
+    """Test an effect that is not saved is rejected without sending."""
+
+    with pytest.raises(HomeAssistantError):
+        await hass.services.async_call(
+            LIGHT_DOMAIN,
+            SERVICE_TURN_ON,
+            {ATTR_ENTITY_ID: ENTITY_1_LIGHT, ATTR_EFFECT: "Unknown"},
+            blocking=True,
+        )
+
+    state = hass.states.get(ENTITY_1_LIGHT)
+    entity = hass.data["cololight"]["entities"][ENTITY_1_LIGHT]
+
+    assert mock_send.call_count == 0
+    assert state.state == STATE_OFF
+    assert state.attributes.get(ATTR_EFFECT) is None
+    assert entity._device.command_sequence == entity._device.sent_sequence
+
+
+@patch("homeassistant.components.cololight.transport.CololightTransport.async_send")
 async def test_turn_on_with_colour(mock_send, hass):
     """Test the light turns on with colour."""
 
@@ -219,7 +248,8 @@ async def test_turn_on_with_colour(mock_send, hass):
 
     state = hass.states.get(ENTITY_1_LIGHT)
 
-    assert mock_send.call_count == 2
+    assert mock_send.call_count == 1
+    assert len(mock_send.call_args.args[1]) == 2
 
     assert state.state == STATE_ON
     assert state.attributes.get("color_mode") == "hs"
@@ -227,7 +257,7 @@ async def test_turn_on_with_colour(mock_send, hass):
     assert state.attributes.get(ATTR_HS_COLOR) == (300, 50)
 
 
-@patch("homeassistant.components.cololight.light.PyCololight._send")
+@patch("homeassistant.components.cololight.transport.CololightTransport.async_send")
 async def test_turn_off(mock_send, hass):
     """Test the light turns off successfully."""
 
@@ -268,6 +298,19 @@ async def test_light_adds_custom_effect(hass):
     assert state.attributes.get(ATTR_EFFECT_LIST) == expected_efects_list
 
 
+async def test_custom_effects_shared_between_lights(hass):
+    """Test lights with the same custom effect options share its commands."""
+    entities = {
+        entity.entity_id: entity
+        for entity in hass.data["entity_components"]["light"].entities
+    }
+    light_2 = entities[ENTITY_2_LIGHT]._light
+    light_4 = entities[ENTITY_4_LIGHT]._light
+
+    assert light_2._effects["Test Effect"] == light_4._effects["Custom Effect"]
+    assert custom_effect_commands.cache_info().hits >= 1
+
+
 async def test_light_handles_incorrect_custom_effect(hass):
     state = hass.states.get(ENTITY_3_LIGHT)
 
@@ -294,3 +337,411 @@ async def test_icon(hass):
 
     assert state_hexagon.attributes.get("icon") == "mdi:hexagon-multiple"
     assert state_strip.attributes.get("icon") == "mdi:led-strip-variant"
+
+
+@patch("homeassistant.components.cololight.transport.CololightTransport.async_send")
+async def test_turn_on_sends_packets_to_host(mock_send, hass):
+    """Test the light sends encoded packets to the device host."""
+
+    await hass.services.async_call(
+        LIGHT_DOMAIN,
+        SERVICE_TURN_ON,
+        {ATTR_ENTITY_ID: ENTITY_1_LIGHT, ATTR_BRIGHTNESS: 255},
+        blocking=True,
+    )
+
+    host, packets, port = mock_send.call_args.args
+
+    assert host == "1.1.1.1"
+    assert port == 8900
+    assert packets[0].hex().endswith("4010301cf64")
+
+
+async def test_lights_share_transport(hass):
+    """Test all devices are driven through one shared transport."""
+    transport = hass.data["cololight"]["transport"]
+
+    entities = hass.data["entity_components"]["light"].entities
+    assert {entity._device._transport for entity in entities} == {transport}
+
+
+@patch(
+    "homeassistant.components.cololight.transport.CololightTransport.async_request",
+    return_value=bytes(40) + bytes([207, 40]),
+)
+async def test_update_reads_state(mock_request, hass):
+    """Test polling reads the on state and brightness from the device."""
+
+    async_fire_time_changed(hass, utcnow() + timedelta(seconds=31))
+    await hass.async_block_till_done()
+
+    state = hass.states.get(ENTITY_1_LIGHT)
+
+    assert state.state == STATE_ON
+    assert state.attributes.get(ATTR_BRIGHTNESS) == 102
+
+
+@patch(
+    "homeassistant.components.cololight.transport.CololightTransport.async_request",
+    side_effect=UnavailableException,
+)
+async def test_update_unavailable(mock_request, hass):
+    """Test the light is unavailable when the device does not reply."""
+
+    async_fire_time_changed(hass, utcnow() + timedelta(seconds=31))
+    await hass.async_block_till_done()
+
+    state = hass.states.get(ENTITY_1_LIGHT)
+
+    assert state.state == STATE_UNAVAILABLE
+
+
+@patch("homeassistant.components.cololight.transport.CololightTransport.async_send")
+@patch(
+    "homeassistant.components.cololight.transport.CololightTransport.async_request",
+    return_value=bytes(40) + bytes([207, 40]),
+)
+async def test_turn_on_to_polled_state_is_skipped(mock_request, mock_send, hass):
+    """Test a command matching the polled state is neither written nor confirmed."""
+    coordinator = hass.data["cololight"]["coordinator"]
+    async_fire_time_changed(hass, utcnow() + timedelta(seconds=31))
+    await hass.async_block_till_done()
+    next_poll = coordinator._next_poll["1.1.1.1"]
+
+    with patch(
+        "homeassistant.helpers.entity.Entity.async_write_ha_state"
+    ) as mock_write:
+        await hass.services.async_call(
+            LIGHT_DOMAIN,
+            SERVICE_TURN_ON,
+            {ATTR_ENTITY_ID: ENTITY_1_LIGHT, ATTR_BRIGHTNESS: 102},
+            blocking=True,
+        )
+
+    assert mock_send.call_count == 0
+    assert mock_write.call_count == 0
+    assert coordinator._next_poll["1.1.1.1"] == next_poll
+
+
+async def test_update_without_reading_keeps_unavailable(hass):
+    """Test a skipped or cancelled query does not make the light available."""
+    coordinator = hass.data["cololight"]["coordinator"]
+
+    coordinator.async_set_updated_data({"1.1.1.1": UnavailableException()})
+    coordinator.async_set_updated_data({"1.1.1.1": None})
+
+    assert hass.states.get(ENTITY_1_LIGHT).state == STATE_UNAVAILABLE
+
+
+@patch(
+    "homeassistant.components.cololight.transport.CololightTransport.async_request",
+    return_value=bytes(40) + bytes([206, 0]),
+)
+async def test_update_polls_all_devices_in_one_pass(mock_request, hass):
+    """Test the first coordinator refresh queries every added device."""
+
+    async_fire_time_changed(hass, utcnow() + timedelta(seconds=2))
+    await hass.async_block_till_done()
+
+    polled_hosts = {call.args[0] for call in mock_request.call_args_list}
+
+    assert mock_request.call_count == 5
+    assert polled_hosts == {"1.1.1.1", "1.1.1.2", "1.1.1.3", "1.1.1.4", "1.1.1.6"}
+
+
+@patch(
+    "homeassistant.components.cololight.transport.CololightTransport.async_request",
+    return_value=bytes(40) + bytes([206, 0]),
+)
+async def test_update_polls_after_first_entry_unloaded(mock_request, hass):
+    """Test unloading the entry that created the coordinator keeps polling."""
+    entry = next(
+        entry
+        for entry in hass.config_entries.async_entries("cololight")
+        if entry.data["host"] == "1.1.1.1"
+    )
+
+    assert await hass.config_entries.async_unload(entry.entry_id)
+    async_fire_time_changed(hass, utcnow() + timedelta(seconds=31))
+    await hass.async_block_till_done()
+
+    polled_hosts = {call.args[0] for call in mock_request.call_args_list}
+
+    assert polled_hosts == {"1.1.1.2", "1.1.1.3", "1.1.1.4", "1.1.1.6"}
+
+
+@patch(
+    "homeassistant.components.cololight.transport.CololightTransport.async_send_many"
+)
+async def test_apply_sends_to_all_lights_at_once(mock_send_many, hass):
+    """Test the apply service sends every device's packets in one call."""
+
+    await hass.services.async_call(
+        "cololight",
+        "apply",
+        {
+            ATTR_ENTITY_ID: [ENTITY_1_LIGHT, ENTITY_4_LIGHT, ENTITY_6_LIGHT],
+            ATTR_HS_COLOR: (300, 50),
+            ATTR_BRIGHTNESS: 60,
+        },
+        blocking=True,
+    )
+
+    sends = mock_send_many.call_args.args[0]
+
+    assert mock_send_many.call_count == 1
+    assert [host for host, _, _ in sends] == ["1.1.1.1", "1.1.1.4", "1.1.1.6"]
+    assert len({tuple(packets) for _, packets, _ in sends}) == 1
+    assert sends[0][1][-1].hex().endswith("4010301cf17")
+    for entity_id in [ENTITY_1_LIGHT, ENTITY_4_LIGHT, ENTITY_6_LIGHT]:
+        state = hass.states.get(entity_id)
+        assert state.state == STATE_ON
+        assert state.attributes.get(ATTR_HS_COLOR) == (300, 50)
+
+
+@patch(
+    "homeassistant.components.cololight.transport.CololightTransport.async_send_many"
+)
+async def test_apply_turns_off(mock_send_many, hass):
+    """Test the apply service turns lights off."""
+
+    await hass.services.async_call(
+        "cololight",
+        "apply",
+        {ATTR_ENTITY_ID: [ENTITY_1_LIGHT, ENTITY_2_LIGHT]},
+        blocking=True,
+    )
+    await hass.services.async_call(
+        "cololight",
+        "apply",
+        {ATTR_ENTITY_ID: [ENTITY_1_LIGHT, ENTITY_2_LIGHT], "state": "off"},
+        blocking=True,
+    )
+
+    sends = mock_send_many.call_args.args[0]
+
+    assert all(packets[0].hex().endswith("e1e") for _, packets, _ in sends)
+    assert hass.states.get(ENTITY_1_LIGHT).state == STATE_OFF
+    assert hass.states.get(ENTITY_2_LIGHT).state == STATE_OFF
+
+
+@patch(
+    "homeassistant.components.cololight.transport.CololightTransport.async_send_many",
+    side_effect=OSError,
+)
+async def test_apply_failure_keeps_state(mock_send_many, hass):
+    """Test a failed apply leaves the lights' colour and brightness unchanged."""
+    entity = hass.data["cololight"]["entities"][ENTITY_1_LIGHT]
+
+    with pytest.raises(OSError):
+        await hass.services.async_call(
+            "cololight",
+            "apply",
+            {
+                ATTR_ENTITY_ID: [ENTITY_1_LIGHT],
+                ATTR_HS_COLOR: (300, 50),
+                ATTR_BRIGHTNESS: 60,
+            },
+            blocking=True,
+        )
+
+    assert not entity.is_on
+    assert entity.hs_color is None
+    assert entity.brightness == 255
+
+
+@patch(
+    "homeassistant.components.cololight.transport.CololightTransport.async_send_many"
+)
+async def test_apply_skips_lights_without_effect(mock_send_many, hass):
+    """Test lights without the requested effect are left alone."""
+
+    await hass.services.async_call(
+        "cololight",
+        "apply",
+        {ATTR_ENTITY_ID: [ENTITY_1_LIGHT, ENTITY_2_LIGHT], ATTR_EFFECT: "Test Effect"},
+        blocking=True,
+    )
+
+    sends = mock_send_many.call_args.args[0]
+
+    assert [host for host, _, _ in sends] == ["1.1.1.2"]
+    assert hass.states.get(ENTITY_1_LIGHT).state == STATE_OFF
+
+
+@patch("homeassistant.components.cololight.transport.CololightTransport.async_send")
+async def test_turn_on_coalesces_commands(mock_send, hass):
+    """Test a burst of commands is collapsed into the newest state."""
+
+    for brightness in [10, 20, 30, 40, 255]:
+        hass.async_create_task(
+            hass.services.async_call(
+                LIGHT_DOMAIN,
+                SERVICE_TURN_ON,
+                {ATTR_ENTITY_ID: ENTITY_1_LIGHT, ATTR_BRIGHTNESS: brightness},
+                blocking=True,
+            )
+        )
+    await hass.async_block_till_done()
+
+    state = hass.states.get(ENTITY_1_LIGHT)
+
+    assert mock_send.call_count == 1
+    assert mock_send.call_args.args[1][0].hex().endswith("f64")
+    assert state.attributes.get(ATTR_BRIGHTNESS) == 255
+
+
+@patch("homeassistant.components.cololight.transport.CololightTransport.async_send")
+async def test_turn_on_coalesces_keeps_colour(mock_send, hass):
+    """Test a pending colour is kept when merged with a brightness change."""
+
+    for service_data in [{ATTR_HS_COLOR: (300, 50)}, {ATTR_BRIGHTNESS: 60}]:
+        hass.async_create_task(
+            hass.services.async_call(
+                LIGHT_DOMAIN,
+                SERVICE_TURN_ON,
+                {ATTR_ENTITY_ID: ENTITY_1_LIGHT, **service_data},
+                blocking=True,
+            )
+        )
+    await hass.async_block_till_done()
+
+    state = hass.states.get(ENTITY_1_LIGHT)
+
+    assert mock_send.call_count == 1
+    assert state.attributes.get(ATTR_HS_COLOR) == (300, 50)
+    assert state.attributes.get(ATTR_BRIGHTNESS) == 60
+
+
+@patch("homeassistant.components.cololight.transport.CololightTransport.async_send")
+async def test_update_ignores_state_read_before_command(mock_send, hass):
+    """Test a reading older than the last command does not revert the state."""
+    coordinator = hass.data["cololight"]["coordinator"]
+
+    await hass.services.async_call(
+        LIGHT_DOMAIN,
+        SERVICE_TURN_ON,
+        {ATTR_ENTITY_ID: ENTITY_1_LIGHT},
+        blocking=True,
+    )
+
+    coordinator.async_set_updated_data({"1.1.1.1": CololightState(False, None, 0)})
+    assert hass.states.get(ENTITY_1_LIGHT).state == STATE_ON
+
+    coordinator.async_set_updated_data({"1.1.1.1": CololightState(False, None, 1)})
+    assert hass.states.get(ENTITY_1_LIGHT).state == STATE_OFF
+
+
+async def test_update_writes_state_only_on_change(hass):
+    """Test polls that read an unchanged state do not write it again."""
+    coordinator = hass.data["cololight"]["coordinator"]
+
+    with patch(
+        "homeassistant.helpers.entity.Entity.async_write_ha_state"
+    ) as mock_write:
+        coordinator.async_set_updated_data({"1.1.1.1": CololightState(True, 40, 0)})
+        coordinator.async_set_updated_data({"1.1.1.1": CololightState(True, 40, 0)})
+        assert mock_write.call_count == 1
+
+        coordinator.async_set_updated_data({"1.1.1.1": CololightState(True, 50, 0)})
+        assert mock_write.call_count == 2
+
+        coordinator.async_set_updated_data({"1.1.1.1": UnavailableException()})
+        coordinator.async_set_updated_data({"1.1.1.1": UnavailableException()})
+        assert mock_write.call_count == 3
+
+
+@patch("homeassistant.components.cololight.transport.CololightTransport.async_send")
+async def test_options_update_applies_effects_in_place(mock_send, hass):
+    """Test changing options updates effects without reloading the light."""
+    entry = next(
+        entry
+        for entry in hass.config_entries.async_entries("cololight")
+        if entry.data["host"] == "1.1.1.1"
+    )
+    cololight_light = hass.data["cololight"][entry.entry_id]
+
+    await hass.services.async_call(
+        LIGHT_DOMAIN,
+        SERVICE_TURN_ON,
+        {ATTR_ENTITY_ID: ENTITY_1_LIGHT, ATTR_BRIGHTNESS: 60},
+        blocking=True,
+    )
+
+    hass.config_entries.async_update_entry(
+        entry,
+        options={
+            "New Effect": {
+                "color_scheme": "Mood",
+                "color": "Red",
+                "cycle_speed": 1,
+                "mode": 1,
+            }
+        },
+    )
+    await hass.async_block_till_done()
+
+    state = hass.states.get(ENTITY_1_LIGHT)
+
+    assert hass.data["cololight"][entry.entry_id] is cololight_light
+    assert state.state == STATE_ON
+    assert state.attributes.get(ATTR_BRIGHTNESS) == 60
+    assert state.attributes.get(ATTR_EFFECT_LIST) == [
+        "Pensieve",
+        "Savasana",
+        "Sunrise",
+        "New Effect",
+    ]
+
+    await hass.services.async_call(
+        LIGHT_DOMAIN,
+        SERVICE_TURN_ON,
+        {ATTR_ENTITY_ID: ENTITY_1_LIGHT, ATTR_EFFECT: "New Effect"},
+        blocking=True,
+    )
+
+    assert mock_send.call_args.args[1][0].hex().endswith("01b32000")
+
+
+async def test_load_effects_failure_keeps_effects(hass):
+    """Test a failed effects update leaves the light's effects as they were."""
+    entry = next(
+        entry
+        for entry in hass.config_entries.async_entries("cololight")
+        if entry.data["host"] == "1.1.1.1"
+    )
+    cololight_light = hass.data["cololight"][entry.entry_id]
+    effects = cololight_light.effects
+    invalid_entry = MockConfigEntry(
+        domain="cololight",
+        data={**entry.data, "default_effects": ["Sunrise", "Unknown"]},
+    )
+
+    with pytest.raises(DefaultEffectExecption):
+        load_effects(cololight_light, invalid_entry)
+
+    assert cololight_light.effects == effects
+
+
+async def test_options_update_applies_rate_limit(hass):
+    """Test changing the command rate options updates the device in place."""
+    entry = next(
+        entry
+        for entry in hass.config_entries.async_entries("cololight")
+        if entry.data["host"] == "1.1.1.1"
+    )
+    device = hass.data["cololight"]["entities"][ENTITY_1_LIGHT]._device
+
+    hass.config_entries.async_update_entry(
+        entry,
+        options={"command_interval": 0.5, "rate_limit": 2.0, "rate_burst": 3},
+    )
+    await hass.async_block_till_done()
+
+    assert device.command_interval == 0.5
+    assert (device.rate_limit.rate, device.rate_limit.burst) == (2.0, 3)
+    assert hass.states.get(ENTITY_1_LIGHT).attributes.get(ATTR_EFFECT_LIST) == [
+        "Pensieve",
+        "Savasana",
+        "Sunrise",
+    ]
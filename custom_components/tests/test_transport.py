@@ -0,0 +1,124 @@
+import asyncio
+import pytest
+
+from unittest.mock import MagicMock
+from pycololight import PyCololight, UnavailableException
+
+from cololight.device import CololightDevice
+from cololight.packets import STATE_PACKETS
+from cololight.transport import CololightTransport
+from emulator import CololightEmulator, async_start_emulators, emulator_host
+
+
+@pytest.fixture
+def transport():
+    """Transport with a mocked socket."""
+    cololight_transport = CololightTransport()
+    cololight_transport._protocol.connection_made(MagicMock())
+    return cololight_transport
+
+
+async def test_request_routes_reply_by_host(transport):
+    """Test replies are matched to the device they came from."""
+
+    request_1 = asyncio.create_task(transport.async_request("1.1.1.1", b"state", 1))
+    request_2 = asyncio.create_task(transport.async_request("1.1.1.2", b"state", 1))
+    await asyncio.sleep(0)
+
+    transport._protocol.datagram_received(b"reply_2", ("1.1.1.2", 8900))
+    transport._protocol.datagram_received(b"reply_1", ("1.1.1.1", 8900))
+
+    assert await request_1 == b"reply_1"
+    assert await request_2 == b"reply_2"
+    assert transport._protocol._waiters == {}
+
+
+async def test_request_times_out(transport):
+    """Test a missing reply raises UnavailableException."""
+
+    with pytest.raises(UnavailableException):
+        await transport.async_request("1.1.1.1", b"state", 0.01)
+
+    assert transport._protocol._waiters == {}
+
+
+async def test_send_uses_one_socket(transport):
+    """Test packets to different devices share the same socket."""
+
+    await transport.async_send("1.1.1.1", [b"a"])
+    await transport.async_send("1.1.1.2", [b"b", b"c"])
+
+    assert transport._protocol.transport.sendto.call_count == 3
+
+
+async def test_send_resolves_hostname(transport):
+    """Test hostnames are resolved before sending, not by sendto."""
+
+    await transport.async_send("localhost", [b"a"])
+    await transport.async_send_many([("localhost", [b"b"], 8900)])
+
+    sendto = transport._protocol.transport.sendto
+    assert [call.args[1] for call in sendto.call_args_list] == [("127.0.0.1", 8900)] * 2
+
+
+async def test_emulated_devices_end_to_end(socket_enabled):
+    """Test commands and state queries against emulated devices."""
+    emulators = await async_start_emulators(3, latency=0.01)
+    transport = CololightTransport()
+
+    try:
+        for emulator in emulators:
+            light = PyCololight(device="hexagon", host=emulator.host)
+            device = CololightDevice(light, emulator.host, transport)
+            await device.async_turn_on(40, effect="Sunrise")
+
+        states = await asyncio.gather(
+            *(
+                CololightDevice(light, emulator.host, transport).async_get_state()
+                for emulator in emulators
+            )
+        )
+    finally:
+        transport.close()
+        for emulator in emulators:
+            emulator.close()
+
+    assert [(state.on, state.brightness) for state in states] == [(True, 40)] * 3
+    assert all(emulator.effect_commands == ["01c10a00"] for emulator in emulators)
+
+
+async def test_emulated_packet_loss(socket_enabled):
+    """Test a lost reply raises UnavailableException."""
+    emulator = await CololightEmulator(loss=1).async_start(emulator_host(0))
+    transport = CololightTransport()
+
+    try:
+        with pytest.raises(UnavailableException):
+            await transport.async_request(emulator.host, b"state", 0.05)
+    finally:
+        transport.close()
+        emulator.close()
+
+
+async def test_emulated_hedged_request(socket_enabled):
+    """Test a hedged duplicate query gets a reply when the first is lost."""
+    emulator = await CololightEmulator(loss=1).async_start(emulator_host(0))
+    transport = CololightTransport()
+    asyncio.get_running_loop().call_later(0.05, setattr, emulator, "loss", 0)
+    sent = []
+
+    try:
+        reply = await transport.async_request(
+            emulator.host,
+            STATE_PACKETS[0],
+            0.5,
+            hedge_delay=0.1,
+            on_send=lambda: sent.append(True),
+        )
+    finally:
+        transport.close()
+        emulator.close()
+
+    assert len(emulator.received) == 1
+    assert len(sent) == 2
+    assert reply[40] == 206